@@ -4,10 +4,13 @@ from content_editor.admin import ContentEditor, ContentEditorInline
 from django import forms
 from django.contrib import messages
 from django.contrib.admin.utils import quote
+from django.forms.models import BaseInlineFormSet
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from feincms3_forms.models import ProxyModelIterable
+
 
 NO_CONTINUE_PARAMETERS = {"_addanother", "_save", "_saveasnew"}
 
@@ -54,8 +57,22 @@ class ConfiguredFormAdmin(ContentEditor):
                 ),
             )
 
+    def get_schema_plugins(self, request, obj):
+        """
+        Return the plugin classes used for the schema snapshot
+
+        Proxies are replaced by their concrete model so that shared tables
+        (e.g. all ``SimpleFieldBase`` proxies) are only loaded once.
+        """
+        return list(
+            dict.fromkeys(inline.model._meta.concrete_model for inline in self.inlines)
+        )
+
     def save_related(self, request, form, formsets, change):
         super().save_related(request, form, formsets, change=change)
+        form.instance.update_schema(
+            plugins=self.get_schema_plugins(request, form.instance)
+        )
         # Only validate if navigating away from this page. Otherwise validation
         # will happen in render_change_form anyway.
         if request.method == "POST" and any(
@@ -87,11 +104,49 @@ class SimpleFieldForm(forms.ModelForm):
             self["placeholder"].label = _("Empty choice label")
 
 
+class SimpleFieldInlineFormSet(BaseInlineFormSet):
+    """
+    Shares the rows of the concrete simple field table between the formsets
+    of all proxies so that the table is only queried once per request
+
+    The queryset passed to the formset contains the rows of all types, the
+    rows are filtered by the type of the formset's proxy afterwards.
+    """
+
+    shared_rows = None
+
+    def get_queryset(self):
+        if not hasattr(self, "_queryset"):
+            if self.shared_rows is None or self.queryset.query.is_empty():
+                self.queryset = self.queryset.filter(type=self.model.TYPE)
+            else:
+                key = (self.model._meta.concrete_model, str(self.queryset.query))
+                if key not in self.shared_rows:
+                    queryset = self.queryset._chain()
+                    queryset._iterable_class = ProxyModelIterable
+                    self.shared_rows[key] = list(queryset)
+                self._queryset = [
+                    row for row in self.shared_rows[key] if row.type == self.model.TYPE
+                ]
+        return super().get_queryset()
+
+
 class SimpleFieldInline(FormFieldInline):
+    """
+    Inline for a ``SimpleFieldBase`` proxy
+
+    ``get_queryset`` returns the rows of all types so that the formsets of
+    all proxies can share them; ``SimpleFieldInlineFormSet`` filters them by
+    type.
+    """
+
     form = SimpleFieldForm
+    formset = SimpleFieldInlineFormSet
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).filter(type=self.model.TYPE)
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.shared_rows = request.__dict__.setdefault("_f3f_simple_fields", {})
+        return formset
 
     @classmethod
     def create(cls, model, **kwargs):
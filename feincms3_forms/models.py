@@ -1,13 +1,23 @@
 import contextlib
+import inspect
+import json
 import re
+import threading
 import warnings
-from functools import partial, reduce
+from collections import ChainMap, OrderedDict
+from functools import lru_cache, partial, reduce
+from types import MappingProxyType
+from typing import ClassVar
 
+from asgiref.sync import sync_to_async
+from content_editor.contents import Contents, contents_for_item
 from content_editor.models import Type
 from django import forms
-from django.core import validators
+from django.apps import apps
+from django.core import checks, validators
 from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.db.models import F, Value, signals
 from django.db.models.fields import BLANK_CHOICE_DASH
 from django.template.defaultfilters import truncatechars
@@ -36,6 +46,17 @@ class FormType(Type):
         setattr(self, attr, value)
         return value
 
+    async def aprocess(self, request, form, **kwargs):
+        """
+        Call the ``process`` function from an async view
+
+        Coroutine functions are awaited directly, synchronous functions are
+        run in a thread using ``sync_to_async``.
+        """
+        if inspect.iscoroutinefunction(self.process):
+            return await self.process(request, form, **kwargs)
+        return await sync_to_async(self.process)(request, form, **kwargs)
+
 
 RANDOM_STRING_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789"
 
@@ -82,6 +103,39 @@ class NameField(models.CharField):
         return value
 
 
+_FIELD_TYPES = [
+    (forms.EmailField, "email"),
+    (forms.URLField, "url"),
+    # DecimalField and FloatField subclass IntegerField
+    (forms.DecimalField, "number"),
+    (forms.FloatField, "number"),
+    (forms.IntegerField, "integer"),
+    (forms.DateTimeField, "datetime"),
+    (forms.DateField, "date"),
+    (forms.BooleanField, "boolean"),
+    (forms.MultipleChoiceField, "multiple-choice"),
+    (forms.ChoiceField, "choice"),
+]
+
+
+def field_constraints(field):
+    """
+    Return the client-side validation constraints of a form field instance
+    """
+    constraints = {
+        "type": next(
+            (name for cls, name in _FIELD_TYPES if isinstance(field, cls)), "text"
+        ),
+        "required": field.required,
+    }
+    for attribute in ["max_length", "min_length", "max_value", "min_value"]:
+        if (value := getattr(field, attribute, None)) is not None:
+            constraints[attribute] = value
+    if isinstance(field, forms.ChoiceField):
+        constraints["choices"] = [str(value) for value, _label in field.choices]
+    return constraints
+
+
 class FormFieldBase(models.Model):
     """
     Form field plugins must inherit this model
@@ -112,6 +166,40 @@ class FormFieldBase(models.Model):
         Return a list of ``clean()`` hooks which receive the form instance,
         return the cleaned data and may optionally raise ``ValidationError``
         instances.
+
+        Wrap hooks using ``cleaner()`` to declare the fields they depend on.
+        """
+        return []
+
+    def get_client_constraints(self):
+        """
+        Return a dictionary of client-side validation constraints per field
+
+        The default implementation derives the constraints from the form
+        fields returned by ``get_fields``. Extend the dictionaries to
+        contribute additional constraints.
+        """
+        return {
+            name: field_constraints(field) for name, field in self.get_fields().items()
+        }
+
+    def get_honeypot_fields(self):
+        """
+        Return the names of fields which have to be left empty by humans
+
+        Used by ``feincms3_forms.screening.screen`` to reject bots before
+        building the form. The default implementation returns no fields.
+        """
+        return []
+
+    def get_screeners(self):
+        """
+        Return a list of additional checks for ``screen``
+
+        Screeners receive the POST data and the form prefix and return the
+        reason for rejecting the request or ``None``. They run before the form
+        is built and shouldn't hit the database. The default implementation
+        returns no screeners.
         """
         return []
 
@@ -138,9 +226,134 @@ class FormFieldBase(models.Model):
 signals.class_prepared.connect(FormFieldBase.set_field_type)
 
 
+def serialize_plugin(plugin):
+    """
+    Return a JSON-serializable representation of the plugin's database state
+    """
+    return {
+        "model": plugin._meta.label_lower,
+        "values": {
+            field.attname: field.value_from_object(plugin)
+            for field in plugin._meta.concrete_fields
+        },
+    }
+
+
+def deserialize_plugin(data):
+    """
+    Instantiate a plugin from the output of ``serialize_plugin`` without
+    hitting the database
+    """
+    model = apps.get_model(data["model"])
+    values = data["values"]
+    return model.from_db(
+        None,
+        [field.attname for field in model._meta.concrete_fields],
+        [
+            field.to_python(values[field.attname])
+            if field.attname in values
+            else field.get_default()
+            for field in model._meta.concrete_fields
+        ],
+    )
+
+
+def _schema_fields(plugin):
+    return [
+        {
+            "name": name,
+            "plugin": plugin.name,
+            "type": plugin.type,
+            "label": str(field.label or ""),
+            "required": field.required,
+            "choices": [(str(value), str(label)) for value, label in field.choices]
+            if hasattr(field, "choices")
+            else None,
+            "region": plugin.region,
+        }
+        for name, field in plugin.get_fields().items()
+    ]
+
+
+@lru_cache(maxsize=64)
+def _formfields_union_plan(plugins, attributes):
+    """
+    Return the columns and the unfiltered per-plugin querysets used by
+    ``ConfiguredForm.get_formfields_union_for_items``
+
+    The introspection only depends on the plugin classes and the attributes
+    and is therefore only done once. The querysets are never evaluated, only
+    cloned by filtering them.
+    """
+    values = ["parent_id", "name"]
+    columns = []
+    for index, attribute in enumerate(attributes):
+        alias = f"__val_{index}"
+        values.append(alias)
+        columns.append((alias, attribute))
+
+    querysets = []
+    for plugin in plugins:
+        if not issubclass(plugin, FormFieldBase):
+            continue
+        annotations = {}
+        for alias, attribute in columns:
+            # See https://code.djangoproject.com/ticket/28553
+            # If we could rely on values_list returning columns in the
+            # specified order **for all querysets** we wouldn't have to do
+            # this. But since that isn't the case we use .annotate() for
+            # all values, even those which 1:1 exist as a column in the
+            # database. I'm not sure if the enumeration is necessary but it
+            # certainly doesn't hurt (more).
+            try:
+                plugin._meta.get_field(attribute)
+            except FieldDoesNotExist:
+                annotations[alias] = Value(getattr(plugin, attribute, ""))
+            else:
+                annotations[alias] = F(attribute)
+        querysets.append(plugin.objects.annotate(**annotations).values_list(*values))
+    return columns, querysets
+
+
+class SchemaSnapshot(models.Model):
+    """
+    Base class for storing superseded schema snapshots
+
+    Subclasses have to add a ``configured_form`` foreign key. Configured forms
+    without a concrete subclass only keep the current snapshot.
+    """
+
+    version = models.PositiveIntegerField(_("version"))
+    schema = models.JSONField(_("schema"), encoder=DjangoJSONEncoder)
+
+    class Meta:
+        abstract = True
+        constraints = (
+            models.UniqueConstraint(
+                fields=["configured_form", "version"],
+                name="%(app_label)s_%(class)s_unique_version",
+            ),
+        )
+        verbose_name = _("schema snapshot")
+        verbose_name_plural = _("schema snapshots")
+
+    def __str__(self):
+        return f"{self.configured_form} v{self.version}"
+
+
 class ConfiguredForm(models.Model):
     name = models.CharField(_("name"), max_length=1000)
     form_type = ChoicesCharField(_("form type"), max_length=100)
+    schema = models.JSONField(
+        _("schema"),
+        default=dict,
+        blank=True,
+        editable=False,
+        encoder=DjangoJSONEncoder,
+    )
+    schema_version = models.PositiveIntegerField(
+        _("schema version"), default=0, editable=False
+    )
 
     class Meta:
         abstract = True
@@ -168,46 +381,203 @@ class ConfiguredForm(models.Model):
             types = {type.key: type for type in sender.FORMS}
             sender.type = property(lambda self: types.get(self.form_type))
 
+    def build_schema(self, *, plugins):
+        """
+        Return a snapshot of the form's plugins and the fields they generate
+
+        The ``plugins`` argument is a list of plugin classes, the same list
+        you would pass to ``contents_for_item``.
+        """
+        contents = contents_for_item(self, plugins=plugins)
+        return {
+            "plugins": [serialize_plugin(plugin) for plugin in contents],
+            "fields": [
+                field
+                for plugin in contents
+                if isinstance(plugin, FormFieldBase)
+                for field in _schema_fields(plugin)
+            ],
+        }
+
+    def update_schema(self, *, plugins):
+        """
+        Persist a new schema snapshot if the plugins have changed since the
+        last snapshot and increment the schema version
+
+        Returns ``True`` if the snapshot has been updated.
+        """
+        # Round-trip through JSON to compare apples to apples
+        schema = json.loads(
+            json.dumps(self.build_schema(plugins=plugins), cls=DjangoJSONEncoder)
+        )
+        if schema == self.schema:
+            return False
+        with transaction.atomic(using=self._state.db):
+            if self.schema and (relation := self._schema_snapshot_relation()):
+                relation.related_model._default_manager.create(
+                    **{relation.field.name: self},
+                    version=self.schema_version,
+                    schema=self.schema,
+                )
+            self.schema = schema
+            self.schema_version += 1
+            self.save(update_fields=["schema", "schema_version"])
+        return True
+
+    update_schema.alters_data = True
+
+    def get_schema(self, version=None):
+        """
+        Return the schema snapshot of the passed version, by default the
+        current version
+
+        Returns ``None`` if the version doesn't exist.
+        """
+        if version is None or version == self.schema_version:
+            return self.schema or None
+        if version > self.schema_version or not (
+            relation := self._schema_snapshot_relation()
+        ):
+            return None
+        return (
+            relation.related_model._default_manager.filter(
+                **{relation.field.name: self}, version=version
+            )
+            .values_list("schema", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def _schema_snapshot_relation(cls):
+        return next(
+            (
+                relation
+                for relation in cls._meta.related_objects
+                if issubclass(relation.related_model, SchemaSnapshot)
+            ),
+            None,
+        )
+
+    def schema_contents(self, version=None):
+        """
+        Return a ``Contents`` instance built from the schema snapshot
+
+        Returns ``None`` if the snapshot doesn't exist.
+        """
+        if not (schema := self.get_schema(version)):
+            return None
+        contents = Contents(self.regions)
+        for data in schema["plugins"]:
+            plugin = deserialize_plugin(data)
+            plugin.parent = self
+            contents.add(plugin)
+        return contents
+
     def get_formfields_union(self, *, plugins, attributes=None):
-        values = ["name"]
-        columns = []
-        for index, attribute in enumerate(attributes or []):
-            alias = f"__val_{index}"
-            values.append(alias)
-            columns.append((alias, attribute))
-
-        querysets = []
-        for plugin in plugins:
-            if not issubclass(plugin, FormFieldBase):
-                continue
-            qs = plugin.objects.filter(parent=self)
-            annotations = {}
-            for alias, attribute in columns:
-                # See https://code.djangoproject.com/ticket/28553
-                # If we could rely on values_list returning columns in the
-                # specified order **for all querysets** we wouldn't have to do
-                # this. But since that isn't the case we use .annotate() for
-                # all values, even those which 1:1 exist as a column in the
-                # database. I'm not sure if the enumeration is necessary but it
-                # certainly doesn't hurt (more).
-                try:
-                    plugin._meta.get_field(attribute)
-                except FieldDoesNotExist:
-                    annotations[alias] = Value(getattr(plugin, attribute, ""))
-                else:
-                    annotations[alias] = F(attribute)
-            qs = qs.annotate(**annotations)
-            querysets.append(qs.values_list(*values))
+        return self.get_formfields_union_for_items(
+            [self], plugins=plugins, attributes=attributes
+        )[self.pk]
+
+    @classmethod
+    def get_formfields_union_for_items(cls, items, *, plugins, attributes=None):
+        """
+        Return the form fields of many configured forms using a single query
+
+        ``items`` is an iterable of configured forms or their primary keys.
+        The return value is a dictionary mapping primary keys to lists of
+        ``(name, {...attributes...})`` tuples.
+        """
+        pks = [getattr(item, "pk", item) for item in items]
+        columns, querysets = _formfields_union_plan(
+            tuple(plugins), tuple(attributes or ())
+        )
+
+        fields = {pk: [] for pk in pks}
+        if not querysets:
+            return fields
+        querysets = [qs.filter(parent__in=pks) for qs in querysets]
         qs = reduce(lambda p, q: p.union(q, all=True), querysets[1:], querysets[0])
-        return [
-            (row[0], {column[1]: value for column, value in zip(columns, row[1:])})
-            for row in qs
-        ]
+        for row in qs:
+            fields[row[0]].append(
+                (row[1], {column[1]: value for column, value in zip(columns, row[2:])})
+            )
+        return fields
 
 
 signals.class_prepared.connect(ConfiguredForm.fill_form_choices)
 
 
+class SchemaCache:
+    """
+    Bounded per-process LRU cache of values derived from schema snapshots
+
+    ``build`` receives the ``Contents`` instance built from the snapshot of a
+    configured form. Snapshots never change once written, so values are
+    cached per configured form and schema version.
+    """
+
+    def __init__(self, build, *, maxsize=256):
+        self.build = build
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, configured_form, version=None):
+        """
+        Return the value for a schema version of the configured form (the
+        current version by default) or ``None`` if the snapshot doesn't exist
+        """
+        if version is None:
+            version = configured_form.schema_version
+        key = (configured_form._meta.label_lower, configured_form.pk, version)
+        with self._lock:
+            if (value := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        if (contents := configured_form.schema_contents(version)) is None:
+            return None
+        value = self.build(contents)
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Submission(models.Model):
+    """
+    Base class for submissions
+
+    Subclasses have to add a ``configured_form`` foreign key. The schema
+    version of the configured form is recorded when saving the submission
+    for the first time. No version is recorded if the configured form has
+    no snapshot yet; such submissions are decoded using the current snapshot
+    like submissions made before versions were recorded.
+    """
+
+    data = models.JSONField(_("data"), default=dict, encoder=DjangoJSONEncoder)
+    schema_version = models.PositiveIntegerField(
+        _("schema version"), blank=True, null=True, editable=False
+    )
+
+    class Meta:
+        abstract = True
+        verbose_name = _("submission")
+        verbose_name_plural = _("submissions")
+
+    def save(self, *args, **kwargs):
+        if self.schema_version is None:
+            self.schema_version = self.configured_form.schema_version or None
+        super().save(*args, **kwargs)
+
+    save.alters_data = True
+
+
 class FormField(FormFieldBase):
     label = models.CharField(_("label"), max_length=1000)
     is_required = models.BooleanField(_("is required"), default=True)
@@ -245,6 +615,56 @@ def simple_loader(data, *, name, label):
     return {"name": name, "label": label, "value": data.get(name)}
 
 
+def _choice_label(labels, value):
+    # Data stored by another field type may contain lists or dictionaries
+    return labels.get(value, value) if isinstance(value, str) else value
+
+
+def choice_loader(data, *, name, label, labels):
+    value = _choice_label(labels, data.get(name))
+    return {"name": name, "label": label, "value": value}
+
+
+def multiple_choice_loader(data, *, name, label, labels):
+    if isinstance(values := data.get(name), list):
+        values = [_choice_label(labels, value) for value in values]
+    return {"name": name, "label": label, "value": values}
+
+
+def cleaner(hook, *, fields):
+    """
+    Declare the form fields a ``clean()`` hook depends on
+
+    The hook is skipped if any of those fields failed validation already.
+    """
+    hook = partial(hook)
+    hook.fields = frozenset(fields)
+    return hook
+
+
+class ProxyModelIterable(models.query.ModelIterable):
+    """
+    Yield instances of the ``SimpleFieldBase`` proxy matching each row's type
+    """
+
+    def __iter__(self):
+        proxies = self.queryset.model._meta.concrete_model.__dict__.get("_proxies", {})
+        for obj in super().__iter__():
+            obj.__class__ = proxies.get(obj.type, obj.__class__)
+            yield obj
+
+
+class SimpleFieldQuerySet(models.QuerySet):
+    def as_proxies(self):
+        """
+        Return instances of the proxy class registered for the ``type`` of
+        each row instead of instances of the queryset's model
+        """
+        clone = self._chain()
+        clone._iterable_class = ProxyModelIterable
+        return clone
+
+
 class SimpleFieldBase(FormField):
     class Type(models.TextChoices):
         TEXT = "text", _("text field")
@@ -281,9 +701,18 @@ class SimpleFieldBase(FormField):
     )
     max_length = models.PositiveIntegerField(_("max length"), blank=True, null=True)
 
+    objects = SimpleFieldQuerySet.as_manager()
+    builders: ClassVar[ChainMap] = ChainMap()
+
     class Meta:
         abstract = True
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Each subclass registers its own builders and falls back to those of
+        # its parent, so proxies see builders registered on the concrete model
+        cls.builders = cls.builders.new_child()
+
     def save(self, *args, **kwargs):
         self.type = self.TYPE
         super().save(*args, **kwargs)
@@ -300,7 +729,7 @@ class SimpleFieldBase(FormField):
 
         meta_class = type("Meta", (cls.Meta,), meta)
 
-        return type(
+        proxy = type(
             f"{cls.__qualname__}_{type_name}",
             (cls,),
             {
@@ -309,6 +738,11 @@ class SimpleFieldBase(FormField):
                 "TYPE": type_name,
             },
         )
+        concrete = cls._meta.concrete_model
+        if "_proxies" not in concrete.__dict__:
+            concrete._proxies = {}
+        concrete._proxies[str(type_name)] = proxy
+        return proxy
 
     def clean_fields(self, exclude=None):
         super().clean_fields(exclude)
@@ -316,7 +750,7 @@ class SimpleFieldBase(FormField):
         if (
             self.choices
             and self.default_value
-            and slugify(self.default_value) not in dict(self.get_choices())
+            and slugify(self.default_value) not in self.get_choice_labels()
         ):
             raise validation_error(
                 _(
@@ -328,14 +762,13 @@ class SimpleFieldBase(FormField):
             )
 
     def get_choices(self):
-        def _choice(value):
-            parts = [part.strip() for part in value.split("|", 1)]
-            if len(parts) == 1:
-                return (slugify(value), value)
-            else:
-                return tuple(parts)
+        return list(_parse_choices(self.choices))
 
-        return [_choice(value) for value in self.choices.splitlines() if value]
+    def get_choice_labels(self):
+        """
+        Return a read-only mapping of choice values to labels
+        """
+        return choice_labels(self.choices)
 
     def get_initial(self):
         if not self.default_value:
@@ -344,99 +777,195 @@ class SimpleFieldBase(FormField):
             return {self.name: slugify(self.default_value)}
         return {self.name: self.default_value}
 
-    def get_fields(self, **kwargs):
-        type = self.Type
-
-        if self.type == type.TEXT:
-            return self.get_field(
-                form_class=forms.CharField,
-                max_length=self.max_length,
-                widget=forms.CharField.widget(
-                    attrs={"placeholder": self.placeholder or False}
-                ),
-            )
+    @classmethod
+    def register_builder(cls, type_name, builder):
+        """
+        Register a field builder for a simple field type
 
-        elif self.type == type.EMAIL:
-            return self.get_field(
-                form_class=forms.EmailField,
-                widget=forms.EmailField.widget(
-                    attrs={"placeholder": self.placeholder or False}
-                ),
-            )
+        The builder receives the plugin instance and returns a dictionary of
+        form fields, most of the time by calling ``plugin.get_field()``.
+        Registering a builder for an existing type replaces it. Builders
+        registered on a concrete model are only used by that model and its
+        proxies, builders registered on ``SimpleFieldBase`` by all models.
+        """
+        cls.builders[str(type_name)] = builder
 
-        elif self.type == type.URL:
-            return self.get_field(
-                form_class=forms.URLField,
-                widget=forms.URLField.widget(
-                    attrs={"placeholder": self.placeholder or False}
-                ),
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super().check(**kwargs)
+        if cls._meta.proxy and str(getattr(cls, "TYPE", "")) not in cls.builders:
+            errors.append(
+                checks.Error(
+                    f"{cls._meta.label} has no field builder for its type {cls.TYPE!r}.",
+                    hint="Register a builder using SimpleFieldBase.register_builder().",
+                    obj=cls,
+                    id="feincms3_forms.E001",
+                )
             )
+        return errors
 
-        elif self.type == type.DATE:
-            return self.get_field(
-                form_class=forms.DateField,
-                widget=forms.DateInput(
-                    attrs={"placeholder": self.placeholder or False, "type": "date"}
-                ),
-            )
+    def get_fields(self, **kwargs):
+        if builder := self.builders.get(self.type):
+            return builder(self)
+        raise ImproperlyConfigured(f"Model {self!r} has unhandled type {self.type!r}")
 
-        elif self.type == type.INTEGER:
-            return self.get_field(
-                form_class=forms.IntegerField,
-                widget=forms.IntegerField.widget(
-                    attrs={"placeholder": self.placeholder or False}
-                ),
+    def get_loaders(self):
+        """
+        Return loaders resolving choice values to their labels for choice
+        fields and the default loaders otherwise
+        """
+        if self.type in {self.Type.SELECT, self.Type.RADIO}:
+            loader = choice_loader
+        elif self.type in {
+            self.Type.SELECT_MULTIPLE,
+            self.Type.CHECKBOX_SELECT_MULTIPLE,
+        }:
+            loader = multiple_choice_loader
+        else:
+            return super().get_loaders()
+        return [
+            partial(
+                loader,
+                label=self.label,
+                name=self.name,
+                labels=self.get_choice_labels(),
             )
+        ]
 
-        elif self.type == type.TEXTAREA:
-            return self.get_field(
-                form_class=forms.CharField,
-                max_length=self.max_length,
-                widget=forms.Textarea(
-                    attrs={
-                        "maxlength": self.max_length or False,
-                        "placeholder": self.placeholder or False,
-                        "rows": 5,
-                    },
-                ),
-            )
 
-        elif self.type == type.CHECKBOX:
-            return self.get_field(form_class=forms.BooleanField)
+@lru_cache(maxsize=256)
+def _parse_choices(choices):
+    def _choice(value):
+        parts = [part.strip() for part in value.split("|", 1)]
+        if len(parts) == 1:
+            return (slugify(value), value)
+        else:
+            return tuple(parts)
 
-        elif self.type == type.SELECT:
-            choices = self.get_choices()
-            if not self.is_required or not self.default_value:
-                blank_choice = (
-                    [("", self.placeholder)] if self.placeholder else BLANK_CHOICE_DASH
-                )
-                choices = blank_choice + choices
-            return self.get_field(
-                form_class=forms.ChoiceField,
-                choices=choices,
-            )
+    return tuple(_choice(value) for value in choices.splitlines() if value)
 
-        elif self.type == type.RADIO:
-            return self.get_field(
-                form_class=forms.ChoiceField,
-                widget=forms.RadioSelect,
-                choices=self.get_choices(),
-            )
 
-        elif self.type == type.SELECT_MULTIPLE:
-            return self.get_field(
-                form_class=forms.MultipleChoiceField,
-                choices=self.get_choices(),
-            )
+@lru_cache(maxsize=256)
+def choice_labels(choices):
+    """
+    Return a read-only mapping of choice values to labels for the ``choices``
+    text of a simple field
+    """
+    return MappingProxyType(dict(_parse_choices(choices)))
 
-        elif self.type == type.CHECKBOX_SELECT_MULTIPLE:
-            return self.get_field(
-                form_class=forms.MultipleChoiceField,
-                widget=forms.CheckboxSelectMultiple,
-                choices=self.get_choices(),
-            )
 
-        else:
-            raise ImproperlyConfigured(
-                f"Model {self!r} has unhandled type {self.type!r}"
-            )
+def _text_field(plugin):
+    return plugin.get_field(
+        form_class=forms.CharField,
+        max_length=plugin.max_length,
+        widget=forms.CharField.widget(
+            attrs={"placeholder": plugin.placeholder or False}
+        ),
+    )
+
+
+def _email_field(plugin):
+    return plugin.get_field(
+        form_class=forms.EmailField,
+        widget=forms.EmailField.widget(
+            attrs={"placeholder": plugin.placeholder or False}
+        ),
+    )
+
+
+def _url_field(plugin):
+    return plugin.get_field(
+        form_class=forms.URLField,
+        widget=forms.URLField.widget(
+            attrs={"placeholder": plugin.placeholder or False}
+        ),
+    )
+
+
+def _date_field(plugin):
+    return plugin.get_field(
+        form_class=forms.DateField,
+        widget=forms.DateInput(
+            attrs={"placeholder": plugin.placeholder or False, "type": "date"}
+        ),
+    )
+
+
+def _integer_field(plugin):
+    return plugin.get_field(
+        form_class=forms.IntegerField,
+        widget=forms.IntegerField.widget(
+            attrs={"placeholder": plugin.placeholder or False}
+        ),
+    )
+
+
+def _textarea_field(plugin):
+    return plugin.get_field(
+        form_class=forms.CharField,
+        max_length=plugin.max_length,
+        widget=forms.Textarea(
+            attrs={
+                "maxlength": plugin.max_length or False,
+                "placeholder": plugin.placeholder or False,
+                "rows": 5,
+            },
+        ),
+    )
+
+
+def _checkbox_field(plugin):
+    return plugin.get_field(form_class=forms.BooleanField)
+
+
+def _select_field(plugin):
+    choices = plugin.get_choices()
+    if not plugin.is_required or not plugin.default_value:
+        blank_choice = (
+            [("", plugin.placeholder)] if plugin.placeholder else BLANK_CHOICE_DASH
+        )
+        choices = blank_choice + choices
+    return plugin.get_field(
+        form_class=forms.ChoiceField,
+        choices=choices,
+    )
+
+
+def _radio_field(plugin):
+    return plugin.get_field(
+        form_class=forms.ChoiceField,
+        widget=forms.RadioSelect,
+        choices=plugin.get_choices(),
+    )
+
+
+def _select_multiple_field(plugin):
+    return plugin.get_field(
+        form_class=forms.MultipleChoiceField,
+        choices=plugin.get_choices(),
+    )
+
+
+def _checkbox_select_multiple_field(plugin):
+    return plugin.get_field(
+        form_class=forms.MultipleChoiceField,
+        widget=forms.CheckboxSelectMultiple,
+        choices=plugin.get_choices(),
+    )
+
+
+SimpleFieldBase.builders.update(
+    {
+        SimpleFieldBase.Type.TEXT: _text_field,
+        SimpleFieldBase.Type.EMAIL: _email_field,
+        SimpleFieldBase.Type.URL: _url_field,
+        SimpleFieldBase.Type.DATE: _date_field,
+        SimpleFieldBase.Type.INTEGER: _integer_field,
+        SimpleFieldBase.Type.TEXTAREA: _textarea_field,
+        SimpleFieldBase.Type.CHECKBOX: _checkbox_field,
+        SimpleFieldBase.Type.SELECT: _select_field,
+        SimpleFieldBase.Type.RADIO: _radio_field,
+        SimpleFieldBase.Type.SELECT_MULTIPLE: _select_multiple_field,
+        SimpleFieldBase.Type.CHECKBOX_SELECT_MULTIPLE: _checkbox_select_multiple_field,
+    }
+)
@@ -1,10 +1,23 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
 from functools import reduce
 from hashlib import sha1
-from operator import add, or_
+from itertools import chain
+from operator import or_
+from time import perf_counter
 
+from content_editor.contents import Contents
 from django import forms
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import signals
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from feincms3.renderer import RegionRenderer, render_in_context
 
-from feincms3_forms.models import FormFieldBase
+from feincms3_forms.models import FormFieldBase, SchemaCache
 
 
 def short_prefix(obj, part=""):
@@ -18,6 +31,38 @@ def short_prefix(obj, part=""):
     return "form-" + sha1(identifier).hexdigest()[:5]
 
 
+class PluginFields(Mapping):
+    """
+    Mapping of plugins to their bound fields
+
+    Bound fields are only created when a plugin's fields are accessed for the
+    first time. The ``None`` key contains all fields which haven't been
+    generated by a plugin, e.g. fields defined on the form class itself.
+    """
+
+    def __init__(self, form, field_names):
+        self._form = form
+        self._field_names = field_names
+        self._fields = {}
+
+    def __getitem__(self, plugin):
+        if (fields := self._fields.get(plugin)) is None:
+            if plugin is None:
+                plugin_names = set().union(*self._field_names.values())
+                names = [name for name in self._form.fields if name not in plugin_names]
+            else:
+                names = self._field_names[plugin]
+            fields = self._fields[plugin] = {name: self._form[name] for name in names}
+        return fields
+
+    def __iter__(self):
+        yield from self._field_names
+        yield None
+
+    def __len__(self):
+        return len(self._field_names) + 1
+
+
 class FormMixin:
     def get_form_fields(self, plugin, *, strip_name_prefix=False):
         """
@@ -46,31 +91,394 @@ class FormMixin:
 
     def clean(self):
         data = super().clean()
+        self.cleaner_timings = []
         for hook in self._f3f_cleaners:
+            if (fields := getattr(hook, "fields", None)) and not fields.isdisjoint(
+                self.errors
+            ):
+                continue
+            start = perf_counter()
             data = hook(self, data)
+            self.cleaner_timings.append((hook, perf_counter() - start))
         return data
 
 
-def create_form(plugins, *, form_class=forms.Form, form_kwargs):
-    field_plugins = [plugin for plugin in plugins if isinstance(plugin, FormFieldBase)]
-    plugin_fields = {plugin: plugin.get_fields() for plugin in field_plugins}
-    all_fields = reduce(or_, plugin_fields.values(), {})
-    all_names = set(all_fields)
+def _parent_key(plugin):
+    try:
+        parent = plugin._meta.get_field("parent")
+    except FieldDoesNotExist:
+        return None
+    return (parent.related_model._meta.label_lower, plugin.parent_id)
+
+
+def _fingerprint(field_plugins):
+    """
+    Return a digest of the database state of all passed field plugins
+    """
+    state = [
+        (
+            plugin._meta.label_lower,
+            [field.value_to_string(plugin) for field in plugin._meta.concrete_fields],
+        )
+        for plugin in field_plugins
+    ]
+    return sha1(repr(state).encode()).hexdigest()
 
+
+def _compile_form(field_plugins, form_class):
+    plugin_fields = [plugin.get_fields() for plugin in field_plugins]
+    all_fields = reduce(or_, plugin_fields, {})
     initial = reduce(
         or_,
         (plugin.get_initial() for plugin in field_plugins),
         {},
     )
+    cleaners = list(
+        chain.from_iterable(plugin.get_cleaners() for plugin in field_plugins)
+    )
+    return (
+        type("Form", (FormMixin, form_class), all_fields),
+        [tuple(fields) for fields in plugin_fields],
+        initial,
+        cleaners,
+    )
+
+
+class FormCache:
+    """
+    Bounded per-process LRU cache of compiled form classes
+
+    Entries are keyed by the form class and a fingerprint of the database
+    state of the field plugins. Saving or deleting a form field plugin drops
+    all entries of its parent.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._parents = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, field_plugins, form_class):
+        """
+        Return the compiled form for the passed field plugins, compiling it
+        first if necessary
+        """
+        key = (form_class, _fingerprint(field_plugins))
+        with self._lock:
+            if (cached := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                return cached[0]
+
+        entry = _compile_form(field_plugins, form_class)
+        parents = {_parent_key(plugin) for plugin in field_plugins}
+        with self._lock:
+            self._entries[key] = (entry, parents)
+            for parent in parents:
+                self._parents.setdefault(parent, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def _discard(self, key):
+        _entry, parents = self._entries.pop(key)
+        for parent in parents:
+            keys = self._parents[parent]
+            keys.discard(key)
+            if not keys:
+                del self._parents[parent]
+
+    def invalidate(self, plugin):
+        """
+        Drop all entries containing fields of the plugin's parent
+        """
+        with self._lock:
+            for key in list(self._parents.get(_parent_key(plugin), ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._parents.clear()
+
+    @staticmethod
+    def invalidate_plugin(sender, instance, **kwargs):
+        if issubclass(sender, FormFieldBase):
+            form_cache.invalidate(instance)
+
+
+form_cache = FormCache()
+
+signals.post_save.connect(FormCache.invalidate_plugin)
+signals.post_delete.connect(FormCache.invalidate_plugin)
+
+
+def create_form(plugins, *, form_class=forms.Form, form_kwargs, cache=False):
+    field_plugins = [plugin for plugin in plugins if isinstance(plugin, FormFieldBase)]
+    if cache:
+        compiled = form_cache.get(field_plugins, form_class)
+    else:
+        compiled = _compile_form(field_plugins, form_class)
+    form_type, plugin_field_names, initial, cleaners = compiled
+
     form_kwargs["initial"] = initial | form_kwargs.get("initial", {})
 
-    form = type("Form", (FormMixin, form_class), all_fields)(**form_kwargs)
-    form._f3f_plugin_fields = {
-        plugin: {name: form[name] for name in fields}
-        for plugin, fields in plugin_fields.items()
-    } | {None: {name: form[name] for name in form.fields if name not in all_names}}
-    form._f3f_cleaners = reduce(
-        add, (plugin.get_cleaners() for plugin in field_plugins), []
+    form = form_type(**form_kwargs)
+    form._f3f_plugin_fields = PluginFields(
+        form, dict(zip(field_plugins, plugin_field_names))
     )
+    form._f3f_cleaners = cleaners
 
     return form
+
+
+def create_forms(contents, *, form_kwargs=None, cache=False):
+    """
+    Create forms for many configured forms at once
+
+    ``contents`` is the return value of ``contents_for_items``, which loads
+    the plugins of all configured forms using one query per plugin class.
+    Returns a dictionary mapping configured forms to form instances. Each form
+    uses ``short_prefix(configured_form, "form")`` as its prefix, so the same
+    ``data`` may be passed to all forms.
+    """
+    return {
+        configured_form: create_form(
+            item_contents,
+            form_class=configured_form.type.form_class,
+            form_kwargs={"prefix": short_prefix(configured_form, "form")}
+            | (form_kwargs or {}),
+            cache=cache,
+        )
+        for configured_form, item_contents in contents.items()
+    }
+
+
+class FormRegionRenderer(RegionRenderer):
+    """
+    Region renderer which renders consecutive form field plugins in one pass
+
+    Field plugins registered using ``register_fields`` are rendered together
+    instead of running a template per plugin. By default the bound fields are
+    rendered directly; set ``fields_template_name`` to render a template once
+    per run of field plugins instead. The template receives a
+    ``plugin_fields`` list of ``(plugin, fields)`` tuples where ``fields`` is
+    the return value of ``form.get_form_fields(plugin)``.
+    """
+
+    fields_template_name = None
+
+    def register_fields(self, plugin, renderer="", **kwargs):
+        kwargs["subregion"] = "fields"
+        self.register(plugin, renderer, **kwargs)
+
+    def handle_fields(self, plugins, context):
+        form = context["form"]
+        plugin_fields = [
+            (plugin, form.get_form_fields(plugin))
+            for plugin in self.takewhile_subregion(plugins, "fields")
+        ]
+        if self.fields_template_name is None:
+            yield mark_safe(
+                "".join(
+                    str(field)
+                    for _plugin, fields in plugin_fields
+                    for field in fields.values()
+                )
+            )
+        else:
+            yield render_in_context(
+                context, self.fields_template_name, {"plugin_fields": plugin_fields}
+            )
+
+
+_field_plugins = SchemaCache(
+    lambda contents: {
+        name: plugin
+        for plugin in contents
+        if isinstance(plugin, FormFieldBase)
+        for name in plugin.get_fields()
+    }
+)
+
+
+def get_field_plugins(configured_form, version=None):
+    """
+    Return a mapping of field names to the plugins generating them
+
+    The plugins are deserialized from the schema snapshot of the configured
+    form and cached per process and schema version. Returns ``None`` if the
+    snapshot doesn't exist.
+    """
+    return _field_plugins.get(configured_form, version)
+
+
+get_field_plugins.cache_clear = _field_plugins.clear
+
+_validation_schemas = SchemaCache(
+    lambda contents: reduce(
+        or_,
+        (
+            plugin.get_client_constraints()
+            for plugin in contents
+            if isinstance(plugin, FormFieldBase)
+        ),
+        {},
+    )
+)
+
+
+def get_validation_schema(configured_form, version=None):
+    """
+    Return the client-side validation constraints of all fields
+
+    The constraints are collected from the plugins' ``get_client_constraints``
+    using the schema snapshot and cached per process and schema version.
+    Returns ``None`` if the snapshot doesn't exist.
+    """
+    return _validation_schemas.get(configured_form, version)
+
+
+get_validation_schema.cache_clear = _validation_schemas.clear
+
+
+def validate_field(configured_form, name, *, data, files=None, prefix=None):
+    """
+    Validate the fields of the plugin generating the field ``name``
+
+    Only the fields and cleaners of this single plugin are built, using the
+    schema snapshot instead of querying plugins. Returns the errors in the
+    format of ``form.errors.get_json_data()`` or ``None`` if the field
+    doesn't exist.
+    """
+    if (field_plugins := get_field_plugins(configured_form)) is None or (
+        plugin := field_plugins.get(name)
+    ) is None:
+        return None
+    form = create_form(
+        [plugin],
+        form_kwargs={"data": data, "files": files, "prefix": prefix},
+        cache=True,
+    )
+    return form.errors.get_json_data()
+
+
+def stream_regions(renderer, *, contents, context, regions=None):
+    """
+    Yield the rendered HTML of regions plugin group by plugin group
+
+    ``renderer`` is a feincms3 ``RegionRenderer``, ``context`` a template
+    ``Context`` (e.g. a ``RequestContext`` containing the form). Renders all
+    regions of ``contents`` unless a list of ``regions`` is passed. Wrap the
+    generator in a ``StreamingHttpResponse`` to start sending large forms
+    before all plugins have been rendered.
+    """
+    for region in contents.regions if regions is None else regions:
+        yield from renderer.handle(contents[region.key], context)
+
+
+def fragment_cache(render, *, timeout=DEFAULT_TIMEOUT, stamp=None):
+    """
+    Wrap a plugin renderer to cache the HTML of non-field plugins
+
+    The cache key contains the plugin's pk, the active language and a
+    modification stamp. The stamp defaults to a digest of all concrete field
+    values of the plugin; pass a callable accepting the plugin to use e.g. a
+    modification timestamp instead. Field plugins depend on bound data and are
+    always rendered.
+    """
+
+    def cached(plugin, context):
+        if isinstance(plugin, FormFieldBase):
+            return render(plugin, context)
+        key = (
+            f"feincms3-forms-fragment-{plugin._meta.label_lower}-{plugin.pk}"
+            f"-{stamp(plugin) if stamp else _fingerprint([plugin])}"
+            f"-{get_language()}"
+        )
+        return mark_safe(
+            caches[DEFAULT_CACHE_ALIAS].get_or_set(
+                key, lambda: str(render(plugin, context)), timeout=timeout
+            )
+        )
+
+    return cached
+
+
+def unbound_form_cache_key(configured_form, *, prefix):
+    """
+    Return the cache key for the rendered unbound form
+
+    The key contains the configured form's schema version and the active
+    language.
+    """
+    return (
+        f"feincms3-forms-unbound-{configured_form._meta.label_lower}"
+        f"-{configured_form.pk}-{configured_form.schema_version}"
+        f"-{prefix}-{get_language()}"
+    )
+
+
+def render_unbound_form(configured_form, *, prefix, render, timeout=DEFAULT_TIMEOUT):
+    """
+    Return the rendered HTML of an unbound form, using the cache if possible
+
+    ``render`` is a callable without arguments returning the HTML. The HTML
+    must not contain any per-user data such as the CSRF token, render those
+    outside. The cache key only changes when the schema version changes, so
+    the cache's default timeout is used to eventually pick up other changes.
+    """
+    return mark_safe(
+        caches[DEFAULT_CACHE_ALIAS].get_or_set(
+            unbound_form_cache_key(configured_form, prefix=prefix),
+            render,
+            timeout=timeout,
+        )
+    )
+
+
+def unbound_form_etag(request, configured_form, *, prefix):
+    """
+    Return an ETag for a page containing an unbound form
+
+    The ETag changes when the form definition, the language or the CSRF
+    secret changes. Use it with ``get_conditional_response`` or the
+    ``condition`` view decorator.
+    """
+    identifier = "-".join(
+        [
+            unbound_form_cache_key(configured_form, prefix=prefix),
+            request.META.get("CSRF_COOKIE", ""),
+        ]
+    )
+    return f'"{sha1(identifier.encode()).hexdigest()}"'
+
+
+async def acontents_for_items(items, plugins, *, regions=None):
+    """
+    Async version of ``content_editor.contents.contents_for_items`` using the
+    async iteration support of Django's ORM, which requires Django 4.1 or
+    better
+    """
+    contents = {item: Contents(regions or item.regions) for item in items}
+    items_dict = {item.pk: item for item in contents}
+    for plugin in plugins:
+        queryset = plugin.get_queryset().filter(parent__in=contents.keys())
+        if regions is not None:
+            queryset = queryset.filter(region__in=[region.key for region in regions])
+        queryset._known_related_objects.setdefault(
+            plugin._meta.get_field("parent"), {}
+        ).update(items_dict)
+        async for obj in queryset:
+            contents[obj.parent].add(obj)
+    return contents
+
+
+async def acontents_for_item(item, plugins, *, regions=None):
+    """
+    Async version of ``content_editor.contents.contents_for_item``
+    """
+    return (await acontents_for_items([item], plugins, regions=regions))[item]
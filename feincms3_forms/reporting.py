@@ -1,9 +1,51 @@
-from itertools import chain
+import csv
+import json
+import re
+from collections import Counter
+from functools import partial
+from hashlib import sha1
+from itertools import chain, groupby
+from operator import attrgetter
 
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import (
+    Avg,
+    Count,
+    IntegerField,
+    JSONField,
+    Max,
+    Min,
+    Q,
+    Value,
+)
+from django.db.models.fields.json import (
+    DataContains,
+    KeyTextTransform,
+    KeyTransform,
+    KeyTransformExact,
+    KeyTransformIsNull,
+)
+from django.db.models.functions import Cast
 from django.template.defaultfilters import linebreaksbr, urlize
 from django.utils.html import format_html, mark_safe
 
-from feincms3_forms.models import FormFieldBase
+from feincms3_forms.models import (
+    FormFieldBase,
+    SchemaCache,
+    choice_labels,
+    choice_loader,
+    multiple_choice_loader,
+    simple_loader,
+)
+
+
+try:
+    import xlsxwriter
+except ImportError:  # pragma: no cover
+    xlsxwriter = None
 
 
 def get_loaders(plugins):
@@ -16,21 +58,473 @@ def get_loaders(plugins):
     )
 
 
+_schema_loaders = SchemaCache(get_loaders)
+
+
+def get_schema_loaders(configured_form, version=None):
+    """
+    Return the loaders for a schema version of the configured form
+
+    Schema snapshots never change once written, so loaders are cached per
+    process and shared by all submissions made against the same version.
+    Returns ``None`` if the snapshot doesn't exist.
+    """
+    return _schema_loaders.get(configured_form, version)
+
+
+get_schema_loaders.cache_clear = _schema_loaders.clear
+
+
 def value_default(row, default="Ø"):
     return row if row["value"] else (row | {"value": default})
 
 
-def simple_report(*, contents, data):
-    def _prettify(row):
-        return row | {"pretty": linebreaksbr(urlize(row["value"]))}
+def report_rows(*, loaders, data):
+    """
+    Return the rows of ``simple_report``
+
+    Each row is the return value of a loader with defaulted values and an
+    additional ``"pretty"`` key containing the value as HTML with links and
+    line breaks, e.g. for reuse in notification emails.
+    """
+    return [
+        row | {"pretty": linebreaksbr(urlize(row["value"]))}
+        for row in (value_default(loader(data)) for loader in loaders)
+    ]
+
 
-    loaders = get_loaders(contents)
+def _digest(value):
+    return sha1(
+        json.dumps(value, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+
+
+def _loaders_key(loaders, data):
+    """
+    Return the names and labels of the loaders and the choice labels of
+    loaders created by ``FormField`` and ``SimpleFieldBase``
+    """
+    return [
+        {
+            key: sorted(value.items()) if key == "labels" else value
+            for key, value in loader.keywords.items()
+        }
+        if _is_known_loader(loader)
+        else [(row := loader(data))["name"], row["label"]]
+        for loader in loaders
+    ]
+
+
+def cached_report_rows(submission, *, loaders, timeout=DEFAULT_TIMEOUT):
+    """
+    Return ``report_rows`` for the submission using Django's default cache
+
+    The cache key contains the submission's model, primary key and schema
+    version and digests of its data and of the loaders' names and labels, so
+    neither modified data nor different loaders return stale rows.
+    """
+    data = _digest(submission.data)
+    labels = _digest(_loaders_key(loaders, submission.data))
+    key = (
+        f"feincms3-forms-report-{submission._meta.label_lower}-{submission.pk}"
+        f"-{getattr(submission, 'schema_version', None)}-{data}-{labels}"
+    )
+    return caches[DEFAULT_CACHE_ALIAS].get_or_set(
+        key,
+        lambda: report_rows(loaders=loaders, data=submission.data),
+        timeout=timeout,
+    )
+
+
+def simple_report(*, contents=None, data=None, loaders=None, rows=None):
+    if rows is None:
+        if loaders is None:
+            loaders = get_loaders(contents)
+        rows = report_rows(loaders=loaders, data=data)
     return mark_safe(
         "<br>\n".join(
             format_html(
                 "<p><strong>{label}</strong> ({name})</p> <p>{pretty}</p>",
-                **_prettify(value_default(loader(data))),
+                **row,
+            )
+            for row in rows
+        )
+    )
+
+
+def _is_known_loader(loader):
+    return (
+        isinstance(loader, partial)
+        and loader.func in {simple_loader, choice_loader, multiple_choice_loader}
+        and not loader.args
+    )
+
+
+def _value_getter(loader):
+    """
+    Return the key for simple loaders and a function returning the value
+    otherwise
+    """
+    if not _is_known_loader(loader):
+        return lambda data: loader(data)["value"]
+
+    name = loader.keywords["name"]
+    if loader.func is simple_loader:
+        return name
+    labels = loader.keywords["labels"]
+    # Data stored by another field type may contain lists or dictionaries
+    if loader.func is choice_loader:
+        return lambda data: (
+            labels.get(value, value)
+            if isinstance(value := data.get(name), str)
+            else value
+        )
+    return lambda data: (
+        [
+            labels.get(value, value) if isinstance(value, str) else value
+            for value in values
+        ]
+        if isinstance(values := data.get(name), list)
+        else values
+    )
+
+
+def compile_loaders(loaders, *, data=None):
+    """
+    Compile loaders into a header and a row extractor
+
+    Returns a tuple of the list of labels and a function receiving the
+    serialized form data and returning a tuple of values. Loaders created by
+    ``FormField`` and ``SimpleFieldBase`` are resolved to plain key and label
+    lookups instead of building a dictionary per field and row; other loaders
+    are called as usual.
+
+    The labels of other loaders are determined by calling them with ``data``,
+    the serialized data of a submission; without ``data`` they have to accept
+    an empty dictionary.
+    """
+    data = {} if data is None else data
+    header = [
+        loader.keywords["label"] if _is_known_loader(loader) else loader(data)["label"]
+        for loader in loaders
+    ]
+    getters = [_value_getter(loader) for loader in loaders]
+
+    if all(isinstance(getter, str) for getter in getters):
+        return header, lambda data: tuple(map(data.get, getters))
+
+    def extract(data):
+        return tuple(
+            data.get(getter) if isinstance(getter, str) else getter(data)
+            for getter in getters
+        )
+
+    return header, extract
+
+
+def _cell(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(map(str, value))
+    return value
+
+
+def get_submission_loaders(submission):
+    """
+    Return the loaders of the schema version the submission has been made
+    against
+
+    Falls back to the current snapshot if the version has no snapshot, e.g.
+    because superseded snapshots aren't kept. Returns ``None`` if the
+    configured form has no snapshot at all.
+    """
+    configured_form = submission.configured_form
+    loaders = get_schema_loaders(configured_form, submission.schema_version)
+    return get_schema_loaders(configured_form) if loaders is None else loaders
+
+
+def _peek(iterator):
+    first = next(iterator)
+    return first, chain([first], iterator)
+
+
+def _group_rows(submissions, *, loaders, columns):
+    first, submissions = _peek(submissions)
+    header, extract = compile_loaders(loaders, data=first.data)
+    yield [*(label for label, _getter in columns), *header]
+    for submission in submissions:
+        yield [
+            *(_cell(getter(submission)) for _label, getter in columns),
+            *map(_cell, extract(submission.data)),
+        ]
+
+
+def export_groups(
+    queryset, *, loaders=get_submission_loaders, columns=(), chunk_size=2000
+):
+    """
+    Yield a ``(submission, rows)`` tuple per configured form and schema version
+
+    ``submission`` is the first submission of the group, ``rows`` yields a
+    header row and one row per submission of the group. ``loaders`` is a
+    callable receiving the first submission of each group and returning the
+    loaders for the whole group; loaders are only compiled once per group.
+    A ``ValueError`` is raised if it returns ``None``.
+    ``columns`` is a list of additional ``(label, callable)`` tuples
+    receiving the submission instance. The queryset is iterated in chunks of
+    ``chunk_size`` submissions so memory use is independent of the number of
+    submissions. Consume the rows of a group before advancing to the next
+    group.
+    """
+    submissions = queryset.order_by(
+        "configured_form_id", "schema_version", "pk"
+    ).iterator(chunk_size=chunk_size)
+    forms = {}
+    for _key, group in groupby(
+        submissions, key=attrgetter("configured_form_id", "schema_version")
+    ):
+        first, group_submissions = _peek(group)
+        # Reuse the configured form instance for all groups of the same form
+        if first.configured_form_id in forms:
+            first.configured_form = forms[first.configured_form_id]
+        else:
+            forms[first.configured_form_id] = first.configured_form
+        if (group_loaders := loaders(first)) is None:
+            raise ValueError(
+                f"No loaders for version {first.schema_version} of"
+                f" {first.configured_form!r}. Save the configured form to create"
+                " a schema snapshot or pass a loaders callable."
             )
-            for loader in loaders
+        yield (
+            first,
+            _group_rows(group_submissions, loaders=group_loaders, columns=columns),
+        )
+
+
+def export_rows(
+    queryset, *, loaders=get_submission_loaders, columns=(), chunk_size=2000
+):
+    """
+    Yield the rows of all groups of ``export_groups``, each group starting with
+    its own header row
+    """
+    for _submission, rows in export_groups(
+        queryset, loaders=loaders, columns=columns, chunk_size=chunk_size
+    ):
+        yield from rows
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """
+    Yield CSV encoded rows, e.g. for a ``StreamingHttpResponse``
+    """
+    writer = csv.writer(_Echo())
+    return (writer.writerow(row) for row in rows)
+
+
+def write_csv(rows, file):
+    """
+    Write rows to a text file opened with ``newline=""``
+    """
+    csv.writer(file).writerows(rows)
+
+
+def write_xlsx(sheets, file):
+    """
+    Write an XLSX file (a path or a file object) containing a worksheet per
+    ``(title, rows)`` tuple
+
+    Requires `XlsxWriter <https://xlsxwriter.readthedocs.io/>`__. The workbook
+    is written in constant memory mode, which flushes every row to a
+    temporary file. Characters not allowed in worksheet titles are removed and
+    titles are truncated to 31 characters; titles have to be unique.
+    """
+    if xlsxwriter is None:  # pragma: no cover
+        raise ImportError("write_xlsx requires XlsxWriter")
+    workbook = xlsxwriter.Workbook(
+        file, {"constant_memory": True, "remove_timezone": True}
+    )
+    for title, rows in sheets:
+        worksheet = workbook.add_worksheet(re.sub(r"[\[\]:*?/\\]", "", title)[:31])
+        for index, row in enumerate(rows):
+            worksheet.write_row(index, 0, row)
+    workbook.close()
+
+
+def _json(value):
+    return Value(value, output_field=JSONField())
+
+
+def _filled(value):
+    """
+    Return a filter matching rows where the JSON value isn't missing, null,
+    an empty string or an empty list
+
+    The lookups are instantiated directly instead of using ``data__<name>``
+    keyword arguments so that names such as ``"contains"`` or ``"0"`` aren't
+    interpreted as lookups or array indexes.
+    """
+    return (
+        Q(KeyTransformIsNull(value, rhs=False))
+        & ~Q(KeyTransformExact(value, _json(None)))
+        & ~Q(KeyTransformExact(value, _json("")))
+        & ~Q(KeyTransformExact(value, _json([])))
+    )
+
+
+def _multiple_choice_counts(queryset, name, choices):
+    """
+    Count the selected values of a multiple choice field
+
+    Uses JSON containment queries if the database supports them and the
+    choices are known, and counts the values in Python otherwise.
+    """
+    if (
+        choices is not None
+        and connections[queryset.db].features.supports_json_field_contains
+    ):
+        values = list(choice_labels(choices))
+        selected = KeyTransform(name, "data")
+        counts = queryset.aggregate(
+            **{
+                f"_f3f_{index}": Count(
+                    "pk", filter=Q(DataContains(selected, _json([value])))
+                )
+                for index, value in enumerate(values)
+            }
         )
+        return {
+            value: counts[f"_f3f_{index}"]
+            for index, value in enumerate(values)
+            if counts[f"_f3f_{index}"]
+        }
+
+    counter = Counter()
+    for selected in (
+        queryset.annotate(_f3f_value=KeyTransform(name, "data"))
+        .values_list("_f3f_value", flat=True)
+        .order_by()
+        .iterator()
+    ):
+        if isinstance(selected, list):
+            counter.update(selected)
+    return dict(counter)
+
+
+def _python_statistics(queryset, fields, *, total):
+    """
+    Compute the statistics of fields in Python
+
+    Used for all-digit names which Django's key transforms interpret as array
+    indexes.
+    """
+    values = {name: [] for name, _attributes in fields}
+    for data in queryset.order_by().values_list("data", flat=True).iterator():
+        for name, filled in values.items():
+            if (value := data.get(name)) not in (None, "", []):
+                filled.append(value)
+
+    statistics = {}
+    for name, attributes in fields:
+        filled = values[name]
+        row = statistics[name] = {
+            "type": attributes.get("type"),
+            "filled": len(filled),
+            "total": total,
+        }
+        if attributes.get("type") == "integer":
+            numbers = [int(value) for value in filled]
+            row |= {
+                "min": min(numbers, default=None),
+                "max": max(numbers, default=None),
+                "avg": sum(numbers) / len(numbers) if numbers else None,
+            }
+        elif attributes.get("type") == "date":
+            row |= {"min": min(filled, default=None), "max": max(filled, default=None)}
+        elif attributes.get("type") in {"select", "radio"}:
+            row["choices"] = dict(
+                Counter(value for value in filled if not isinstance(value, list))
+            )
+        elif attributes.get("type") in {"select-multiple", "checkbox-select-multiple"}:
+            counter = Counter()
+            for value in filled:
+                if isinstance(value, list):
+                    counter.update(value)
+            row["choices"] = dict(counter)
+    return statistics
+
+
+def field_statistics(queryset, *, fields):
+    """
+    Return per-field statistics of submissions computed in the database
+
+    ``fields`` is a list of ``(name, attributes)`` tuples as returned by
+    ``get_formfields_union(plugins=..., attributes=["type", "choices"])``.
+    All fields get the number of submissions containing a value
+    (``"filled"``) and the number of submissions (``"total"``). Depending on
+    the type, fields additionally get ``"choices"`` (a dictionary mapping
+    values to counts) or ``"min"``, ``"max"`` and, for integers, ``"avg"``.
+    Field names are never parsed as lookups. Django's key transforms
+    interpret all-digit names as array indexes, so the statistics of those
+    fields are computed in Python.
+    """
+    fields = list(fields)
+    aggregates = {"total": Count("pk")}
+    for index, (name, attributes) in enumerate(fields):
+        if name.isdigit():
+            continue
+        filled = _filled(KeyTransform(name, "data"))
+        value = KeyTextTransform(name, "data")
+        aggregates[f"filled_{index}"] = Count("pk", filter=filled)
+        if attributes.get("type") == "integer":
+            number = Cast(value, IntegerField())
+            aggregates |= {
+                f"min_{index}": Min(number, filter=filled),
+                f"max_{index}": Max(number, filter=filled),
+                f"avg_{index}": Avg(number, filter=filled),
+            }
+        elif attributes.get("type") == "date":
+            aggregates |= {
+                f"min_{index}": Min(value, filter=filled),
+                f"max_{index}": Max(value, filter=filled),
+            }
+    result = queryset.order_by().aggregate(**aggregates)
+
+    digits = [(name, attributes) for name, attributes in fields if name.isdigit()]
+    python = (
+        _python_statistics(queryset, digits, total=result["total"]) if digits else {}
     )
+
+    statistics = {}
+    for index, (name, attributes) in enumerate(fields):
+        if name in python:
+            statistics[name] = python[name]
+            continue
+
+        row = statistics[name] = {
+            "type": attributes.get("type"),
+            "filled": result[f"filled_{index}"],
+            "total": result["total"],
+        }
+        for key in ["min", "max", "avg"]:
+            if f"{key}_{index}" in result:
+                row[key] = result[f"{key}_{index}"]
+
+        if attributes.get("type") in {"select", "radio"}:
+            row["choices"] = {
+                item["value"]: item["count"]
+                for item in queryset.filter(_filled(KeyTransform(name, "data")))
+                .order_by()
+                .values(value=KeyTextTransform(name, "data"))
+                .annotate(count=Count("pk"))
+            }
+        elif attributes.get("type") in {"select-multiple", "checkbox-select-multiple"}:
+            row["choices"] = _multiple_choice_counts(
+                queryset, name, attributes.get("choices")
+            )
+
+    return statistics
@@ -0,0 +1,121 @@
+from time import time
+
+from django.core import signing
+from django.utils.html import format_html
+
+from feincms3_forms.models import FormFieldBase, SchemaCache
+
+
+TIMING_FIELD = "f3f-timing"
+TIMING_SALT = "feincms3_forms.screening.timing"
+
+_honeypot_fields = SchemaCache(
+    lambda contents: [
+        name
+        for plugin in contents
+        if isinstance(plugin, FormFieldBase)
+        for name in plugin.get_honeypot_fields()
+    ]
+)
+
+
+def get_honeypot_fields(configured_form, version=None):
+    """
+    Return the names of all honeypot fields of the configured form
+
+    The names are collected from the plugins' ``get_honeypot_fields`` using
+    the schema snapshot and cached per process and schema version. Returns
+    ``None`` if the snapshot doesn't exist.
+    """
+    return _honeypot_fields.get(configured_form, version)
+
+
+get_honeypot_fields.cache_clear = _honeypot_fields.clear
+
+_screeners = SchemaCache(
+    lambda contents: [
+        screener
+        for plugin in contents
+        if isinstance(plugin, FormFieldBase)
+        for screener in plugin.get_screeners()
+    ]
+)
+
+
+def get_screeners(configured_form, version=None):
+    """
+    Return the screeners of all plugins of the configured form
+
+    The screeners are collected from the plugins' ``get_screeners`` using the
+    schema snapshot and cached per process and schema version. Returns
+    ``None`` if the snapshot doesn't exist.
+    """
+    return _screeners.get(configured_form, version)
+
+
+get_screeners.cache_clear = _screeners.clear
+
+
+def timing_token_input(prefix):
+    """
+    Return a hidden input containing a signed timestamp for ``screen``
+    """
+    return format_html(
+        '<input type="hidden" name="{}-{}" value="{}">',
+        prefix,
+        TIMING_FIELD,
+        signing.dumps(int(time()), salt=TIMING_SALT),
+    )
+
+
+def screen(
+    request,
+    configured_form,
+    *,
+    prefix,
+    min_seconds=3,
+    max_age=86400,
+    max_size=None,
+):
+    """
+    Cheaply check a POST request for signs of bots
+
+    Runs before loading plugins and building the form. Checks the size of
+    the request body (without reading it) if ``max_size`` is given, the
+    honeypot fields and screeners of the schema snapshot and the timing token
+    added using ``timing_token_input``; pass ``min_seconds=None`` to skip the
+    timing check. Returns the reason for rejecting the request (``"size"``,
+    ``"honeypot"``, the reason returned by a screener or ``"timing"``) or
+    ``None``.
+    """
+    try:
+        size = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        size = 0
+    if max_size is not None and size > max_size:
+        return "size"
+
+    data = request.POST
+    if any(
+        data.get(f"{prefix}-{name}")
+        for name in get_honeypot_fields(configured_form) or ()
+    ):
+        return "honeypot"
+
+    for screener in get_screeners(configured_form) or ():
+        if reason := screener(data, prefix):
+            return reason
+
+    if min_seconds is not None:
+        try:
+            timestamp = signing.loads(
+                data.get(f"{prefix}-{TIMING_FIELD}", ""),
+                salt=TIMING_SALT,
+                max_age=max_age,
+            )
+        except signing.BadSignature:
+            return "timing"
+        if time() - timestamp < min_seconds:
+            return "timing"
+
+    return None
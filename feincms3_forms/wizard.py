@@ -0,0 +1,85 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from feincms3_forms.renderer import create_form, short_prefix
+
+
+class Wizard:
+    """
+    Server-side state of a multi-step form
+
+    Each region of the configured form is a step. Only the form of the
+    current step is built and validated; the cleaned data of completed steps
+    is kept in the session as JSON and isn't validated again. The state is
+    discarded when the schema version of the configured form changes.
+    """
+
+    def __init__(self, request, configured_form):
+        self.request = request
+        self.configured_form = configured_form
+        self.session_key = (
+            f"f3f-wizard-{configured_form._meta.label_lower}-{configured_form.pk}"
+        )
+        state = request.session.get(self.session_key)
+        if not state or state["version"] != configured_form.schema_version:
+            state = self._initial_state()
+        self._state = state
+
+    def _initial_state(self):
+        return {"version": self.configured_form.schema_version, "done": [], "data": {}}
+
+    @property
+    def steps(self):
+        return self.configured_form.regions
+
+    @property
+    def step(self):
+        """
+        Return the region of the current step or ``None`` if all steps have
+        been completed
+        """
+        return next(
+            (step for step in self.steps if step.key not in self._state["done"]),
+            None,
+        )
+
+    @property
+    def data(self):
+        """
+        Return the accumulated data of all completed steps
+        """
+        return self._state["data"]
+
+    def create_form(self, contents, *, form_kwargs=None, cache=False):
+        """
+        Create the form of the current step
+
+        ``contents`` only has to contain the plugins of the current step, e.g.
+        ``contents_for_item(cf, plugins=..., regions=[wizard.step])``. Raises
+        ``ValueError`` if all steps have been completed already.
+        """
+        if (step := self.step) is None:
+            raise ValueError("All steps of the wizard have been completed.")
+        return create_form(
+            contents[step.key],
+            form_class=self.configured_form.type.form_class,
+            form_kwargs={"prefix": short_prefix(self.configured_form, step.key)}
+            | (form_kwargs or {}),
+            cache=cache,
+        )
+
+    def save_step(self, form):
+        """
+        Merge the cleaned data of the valid form into the state and advance to
+        the next step
+        """
+        self._state["data"] |= json.loads(
+            json.dumps(form.cleaned_data, cls=DjangoJSONEncoder)
+        )
+        self._state["done"].append(self.step.key)
+        self.request.session[self.session_key] = self._state
+
+    def reset(self):
+        self._state = self._initial_state()
+        self.request.session.pop(self.session_key, None)
@@ -31,5 +31,15 @@ def process_contact_form(request, form, *, configured_form):
     return HttpResponseRedirect(".")
 
 
+async def process_contact_form_async(request, form, *, configured_form):
+    await Log.objects.acreate(configured_form=configured_form, data=form.cleaned_data)
+    return HttpResponseRedirect("..")
+
+
+def process_wizard_form(request, form, *, configured_form, data):
+    Log.objects.create(configured_form=configured_form, data=data)
+    return HttpResponseRedirect(".")
+
+
 class OtherFieldsForm(forms.Form):
     email = forms.EmailField()
@@ -2,7 +2,6 @@ from functools import partial
 
 from content_editor.models import Region, create_plugin_base
 from django import forms
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -18,6 +17,21 @@ class ConfiguredForm(forms_models.ConfiguredForm):
             validate="testapp.forms.validate_contact_form",
             process="testapp.forms.process_contact_form",
         ),
+        forms_models.FormType(
+            key="async",
+            label=_("async contact form"),
+            regions=[Region(key="form", title=_("form"))],
+            process="testapp.forms.process_contact_form_async",
+        ),
+        forms_models.FormType(
+            key="wizard",
+            label=_("wizard"),
+            regions=[
+                Region(key="personal", title=_("personal")),
+                Region(key="details", title=_("details")),
+            ],
+            process="testapp.forms.process_wizard_form",
+        ),
         forms_models.FormType(
             key="other-fields",
             label=_("other fields"),
@@ -91,7 +105,17 @@ class Duration(forms_models.FormFieldBase, ConfiguredFormPlugin):
         }
 
     def get_cleaners(self):
-        return [partial(clean_duration, name=self.name)]
+        return [
+            forms_models.cleaner(
+                partial(clean_duration, name=self.name),
+                fields=[f"{self.name}_from", f"{self.name}_until"],
+            )
+        ]
+
+    def get_client_constraints(self):
+        constraints = super().get_client_constraints()
+        constraints[f"{self.name}_until"]["after"] = f"{self.name}_from"
+        return constraints
 
 
 class HoneypotField(forms.CharField):
@@ -112,10 +136,22 @@ class Honeypot(forms_models.FormFieldBase, ConfiguredFormPlugin):
     def get_fields(self, **kwargs):
         return {self.name: HoneypotField(required=False)}
 
+    def get_honeypot_fields(self):
+        return [self.name]
+
+    def get_screeners(self):
+        def screener(data, prefix):
+            return None if f"{prefix}-{self.name}" in data else "missing"
+
+        return [screener]
+
+
+class ConfiguredFormSchema(forms_models.SchemaSnapshot):
+    configured_form = models.ForeignKey(ConfiguredForm, on_delete=models.CASCADE)
+
 
-class Log(models.Model):
+class Log(forms_models.Submission):
     configured_form = models.ForeignKey(ConfiguredForm, on_delete=models.CASCADE)
-    data = models.JSONField(encoder=DjangoJSONEncoder)
 
     def __str__(self):
         return ""
@@ -56,3 +56,6 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
+
+# The testapp.Anything proxy exists to exercise the unhandled type code path
+SILENCED_SYSTEM_CHECKS = ["feincms3_forms.E001"]
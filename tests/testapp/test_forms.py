@@ -1,20 +1,80 @@
-from content_editor.contents import contents_for_item
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from operator import attrgetter
+from unittest import mock
+
+from content_editor.contents import contents_for_item, contents_for_items
 from django import forms, test
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
-from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.test.utils import isolate_apps
-
-from feincms3_forms.models import FormField, FormFieldBase, FormType
-from feincms3_forms.renderer import create_form
-from feincms3_forms.reporting import get_loaders, simple_report, value_default
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    PermissionDenied,
+    ValidationError,
+)
+from django.db import connection
+from django.template import Context
+from django.template.defaultfilters import urlize
+from django.test.utils import CaptureQueriesContext, isolate_apps
+
+from feincms3_forms.admin import SimpleFieldInline
+from feincms3_forms.models import (
+    FormField,
+    FormFieldBase,
+    FormType,
+    SchemaCache,
+    SimpleFieldBase,
+    _formfields_union_plan,
+    field_constraints,
+)
+from feincms3_forms.renderer import (
+    FormRegionRenderer,
+    acontents_for_item,
+    create_form,
+    create_forms,
+    form_cache,
+    fragment_cache,
+    get_field_plugins,
+    get_validation_schema,
+    short_prefix,
+)
+from feincms3_forms.reporting import (
+    cached_report_rows,
+    compile_loaders,
+    export_groups,
+    export_rows,
+    field_statistics,
+    get_loaders,
+    get_schema_loaders,
+    simple_report,
+    stream_csv,
+    value_default,
+    write_csv,
+    write_xlsx,
+)
+from feincms3_forms.screening import (
+    TIMING_FIELD,
+    TIMING_SALT,
+    get_honeypot_fields,
+    get_screeners,
+)
 from feincms3_forms.validation import Error, Warning
+from feincms3_forms.wizard import Wizard
+from testapp.forms import OtherFieldsForm
 from testapp.models import (
     URL,
     Anything,
     Checkbox,
     CheckboxSelectMultiple,
     ConfiguredForm,
+    ConfiguredFormSchema,
     Date,
     Duration,
     Email,
@@ -25,6 +85,7 @@ from testapp.models import (
     Radio,
     Select,
     SelectMultiple,
+    SimpleField,
     Text,
     Textarea,
 )
@@ -244,6 +305,15 @@ class FormsTest(test.TestCase):
         plugin.default_value = "B is fun"
         self.assertEqual(plugin.get_initial(), {"name": "b-is-fun"})
 
+        self.assertEqual(plugin.get_choice_labels(), {"a": "A", "b-is-fun": "B is fun"})
+        self.assertIs(
+            plugin.get_choice_labels(),
+            Select(choices="A\nB is fun").get_choice_labels(),
+        )
+        # get_choices returns a fresh list every time
+        plugin.get_choices().append(("c", "C"))
+        self.assertEqual(len(plugin.get_choices()), 2)
+
         plugin = Select(
             choices="KEY VALUE | pretty label\n OTHER VALUE | other pretty label \n\n",
             default_value="",
@@ -540,6 +610,27 @@ class FormsTest(test.TestCase):
 
         self.assertEqual(Anything.TYPE, "anything")
 
+    def test_register_builder(self):
+        self.assertEqual(
+            [error.id for error in Anything.check()], ["feincms3_forms.E001"]
+        )
+        self.assertEqual(Text.check(), [])
+        self.assertEqual(SimpleField.check(), [])
+
+        SimpleField.register_builder(
+            "anything",
+            lambda plugin: plugin.get_field(form_class=forms.SlugField),
+        )
+        try:
+            # Only the concrete model and its proxies use the builder
+            self.assertNotIn("anything", SimpleFieldBase.builders)
+            self.assertEqual(Anything.check(), [])
+            fields = Anything(name="slug", label="Slug", type="anything").get_fields()
+            self.assertIsInstance(fields["slug"], forms.SlugField)
+            self.assertEqual(fields["slug"].label, "Slug")
+        finally:
+            del SimpleField.builders["anything"]
+
     def test_all_simpleformfield_types(self):
         cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
         plugins = [
@@ -607,3 +698,1330 @@ class FormsTest(test.TestCase):
             str(Duration(label_from="f", label_until="u")),
             "f - u",
         )
+
+    def test_form_cache(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        plugin = Text.objects.create(
+            parent=cf,
+            region="form",
+            ordering=10,
+            label="Full name",
+            name="full_name",
+        )
+        form_cache.clear()
+
+        form1 = create_form([plugin], form_kwargs={}, cache=True)
+        form2 = create_form(
+            contents_for_item(cf, plugins=[Text]), form_kwargs={}, cache=True
+        )
+        self.assertIs(form1.__class__, form2.__class__)
+        self.assertEqual(len(form_cache), 1)
+        self.assertEqual(set(form2.get_form_fields(plugin)), {"full_name"})
+
+        # Unsaved changes produce a different fingerprint
+        plugin.label = "Name"
+        form3 = create_form([plugin], form_kwargs={}, cache=True)
+        self.assertIsNot(form1.__class__, form3.__class__)
+        self.assertEqual(form3.fields["full_name"].label, "Name")
+        self.assertEqual(len(form_cache), 2)
+
+        # Saving invalidates all entries of the configured form
+        plugin.save()
+        self.assertEqual(len(form_cache), 0)
+
+        form_cache.maxsize = 1
+        try:
+            create_form([plugin], form_kwargs={}, cache=True)
+            create_form([plugin], form_class=forms.Form, form_kwargs={}, cache=True)
+            plugin.label = "Full name"
+            create_form([plugin], form_kwargs={}, cache=True)
+            self.assertEqual(len(form_cache), 1)
+        finally:
+            form_cache.maxsize = 128
+            form_cache.clear()
+
+        # The uncached path still works
+        self.assertIsNot(
+            create_form([plugin], form_kwargs={}).__class__,
+            create_form([plugin], form_kwargs={}).__class__,
+        )
+
+    def test_schema_snapshot(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        self.assertIsNone(cf.schema_contents())
+
+        Email.objects.create(
+            parent=cf,
+            region="form",
+            ordering=10,
+            label="Email",
+            name="email",
+        )
+        Select.objects.create(
+            parent=cf,
+            region="form",
+            ordering=20,
+            label="Language",
+            name="language",
+            choices="German\nFrench",
+            is_required=False,
+        )
+        PlainText.objects.create(
+            parent=cf,
+            region="form",
+            ordering=30,
+            text="Thanks",
+        )
+
+        data = {
+            "name": cf.name,
+            "form_type": cf.form_type,
+            "testapp_duration_set-TOTAL_FORMS": 0,
+            "testapp_duration_set-INITIAL_FORMS": 0,
+            "testapp_plaintext_set-TOTAL_FORMS": 0,
+            "testapp_plaintext_set-INITIAL_FORMS": 0,
+            "testapp_simplefield_set-TOTAL_FORMS": 0,
+            "testapp_simplefield_set-INITIAL_FORMS": 0,
+        }
+        for i in range(20):
+            data |= {
+                f"testapp_simplefield_set-{i}-TOTAL_FORMS": 0,
+                f"testapp_simplefield_set-{i}-INITIAL_FORMS": 0,
+            }
+        self.client.post(f"/admin/testapp/configuredform/{cf.id}/change/", data)
+
+        cf.refresh_from_db()
+        self.assertEqual(cf.schema_version, 1)
+        self.assertEqual(
+            cf.schema["fields"],
+            [
+                {
+                    "name": "email",
+                    "plugin": "email",
+                    "type": "email",
+                    "label": "Email",
+                    "required": True,
+                    "choices": None,
+                    "region": "form",
+                },
+                {
+                    "name": "language",
+                    "plugin": "language",
+                    "type": "select",
+                    "label": "Language",
+                    "required": False,
+                    "choices": [
+                        ["", "---------"],
+                        ["german", "German"],
+                        ["french", "French"],
+                    ],
+                    "region": "form",
+                },
+            ],
+        )
+
+        # Unchanged plugins do not bump the version
+        plugins = [PlainText, SimpleField, Duration, Honeypot]
+        self.assertFalse(cf.update_schema(plugins=plugins))
+        self.assertEqual(cf.schema_version, 1)
+
+        with self.assertNumQueries(0):
+            contents = cf.schema_contents()
+            form = create_form(contents["form"], form_kwargs={"auto_id": ""})
+        self.assertEqual(list(form.fields), ["email", "language"])
+        self.assertEqual([plugin.text for plugin in contents["form"][2:]], ["Thanks"])
+
+        Text.objects.create(
+            parent=cf,
+            region="form",
+            ordering=40,
+            label="Comment",
+            name="comment",
+        )
+        self.assertTrue(cf.update_schema(plugins=plugins))
+        self.assertEqual(cf.schema_version, 2)
+        self.assertEqual(len(cf.schema["fields"]), 3)
+
+    def test_schema_versioned_submissions(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        plugin = Text.objects.create(
+            parent=cf,
+            region="form",
+            ordering=10,
+            label="Full name",
+            name="full_name",
+        )
+        plugins = [PlainText, SimpleField, Duration, Honeypot]
+        get_schema_loaders.cache_clear()
+        self.assertIsNone(get_schema_loaders(cf))
+
+        # Version 0 has no snapshot, the current snapshot is used later
+        log0 = Log.objects.create(configured_form=cf, data={"full_name": "Fritz"})
+        self.assertIsNone(log0.schema_version)
+
+        cf.update_schema(plugins=plugins)
+        log1 = Log.objects.create(configured_form=cf, data={"full_name": "Hans"})
+        self.assertEqual(log1.schema_version, 1)
+
+        plugin.label = "Name"
+        plugin.save()
+        cf.update_schema(plugins=plugins)
+        log2 = Log.objects.create(configured_form=cf, data={"full_name": "Franz"})
+        self.assertEqual(log2.schema_version, 2)
+        self.assertEqual(
+            list(
+                ConfiguredFormSchema.objects.values_list("configured_form", "version")
+            ),
+            [(cf.pk, 1)],
+        )
+
+        cf = ConfiguredForm.objects.get()
+        # Superseded snapshots are loaded once
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [
+                    loader(log.data)
+                    for log in [log1, log2]
+                    for loader in get_schema_loaders(cf, log.schema_version)
+                ],
+                [
+                    {"name": "full_name", "label": "Full name", "value": "Hans"},
+                    {"name": "full_name", "label": "Name", "value": "Franz"},
+                ],
+            )
+            self.assertIs(get_schema_loaders(cf, 2), get_schema_loaders(cf))
+            self.assertIsNone(get_schema_loaders(cf, 3))
+
+        self.assertEqual(
+            simple_report(loaders=get_schema_loaders(cf, 1), data=log1.data),
+            "<p><strong>Full name</strong> (full_name)</p> <p>Hans</p>",
+        )
+        self.assertIs(
+            get_schema_loaders(cf, log0.schema_version), get_schema_loaders(cf, 2)
+        )
+
+    def test_single_query_proxies(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        for index, cls in enumerate([Text, Email, Select, Anything]):
+            cls.objects.create(
+                parent=cf,
+                region="form",
+                ordering=10 * index,
+                label="field",
+                name=f"field_{index}",
+                choices="a\nb",
+            )
+
+        self.assertEqual(
+            [type(obj) for obj in SimpleField.objects.as_proxies()],
+            [Text, Email, Select, Anything],
+        )
+        self.assertEqual(
+            [
+                type(obj)
+                for obj in SimpleField.objects.as_proxies().filter(type="email")
+            ],
+            [Email],
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/admin/testapp/configuredform/{cf.id}/change/")
+        self.assertEqual(
+            len(
+                [q for q in ctx.captured_queries if '"testapp_simplefield"' in q["sql"]]
+            ),
+            # One for the admin inlines, one for the validation
+            2,
+        )
+        self.assertContains(response, 'value="field_0"')
+        self.assertContains(response, 'value="field_3"')
+        self.assertContains(
+            response,
+            'name="testapp_simplefield_set-2-TOTAL_FORMS" value="1"',
+        )
+
+        # Overridden inline querysets are respected and still shared
+        get_queryset = SimpleFieldInline.get_queryset
+        patched = mock.patch.object(
+            SimpleFieldInline,
+            "get_queryset",
+            lambda self, request: get_queryset(self, request).exclude(name="field_3"),
+        )
+        with patched, CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/admin/testapp/configuredform/{cf.id}/change/")
+        self.assertEqual(
+            len(
+                [q for q in ctx.captured_queries if '"testapp_simplefield"' in q["sql"]]
+            ),
+            2,
+        )
+        self.assertContains(response, 'value="field_0"')
+        self.assertNotContains(response, 'value="field_3"')
+
+    def test_get_formfields_union_for_items(self):
+        cf1 = ConfiguredForm.objects.create(name="Test 1", form_type="contact")
+        cf2 = ConfiguredForm.objects.create(name="Test 2", form_type="contact")
+        cf3 = ConfiguredForm.objects.create(name="Test 3", form_type="contact")
+        Email.objects.create(parent=cf1, region="form", ordering=10, name="email")
+        Text.objects.create(parent=cf2, region="form", ordering=10, name="subject")
+        Honeypot.objects.create(parent=cf2, region="form", ordering=20)
+
+        with self.assertNumQueries(1):
+            fields = ConfiguredForm.get_formfields_union_for_items(
+                [cf1, cf2.pk, cf3],
+                plugins=[PlainText, SimpleField, Honeypot],
+                attributes=["type"],
+            )
+        self.assertEqual(fields[cf1.pk], [("email", {"type": "email"})])
+        self.assertCountEqual(
+            fields[cf2.pk],
+            [("subject", {"type": "text"}), ("honeypot", {"type": "honeypot"})],
+        )
+        self.assertEqual(fields[cf3.pk], [])
+
+        self.assertEqual(
+            ConfiguredForm.get_formfields_union_for_items([cf1], plugins=[PlainText]),
+            {cf1.pk: []},
+        )
+
+    def test_formfields_union_plan(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Email.objects.create(parent=cf, region="form", ordering=10, name="email")
+
+        _formfields_union_plan.cache_clear()
+        for _ in range(3):
+            self.assertEqual(
+                cf.get_formfields_union(
+                    plugins=[PlainText, SimpleField, Honeypot],
+                    attributes=["type", "is_required"],
+                ),
+                [("email", {"type": "email", "is_required": True})],
+            )
+        info = _formfields_union_plan.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+    def test_lazy_plugin_fields(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        plugin = Duration.objects.create(
+            parent=cf,
+            region="form",
+            name="duration",
+            ordering=10,
+            label_from="from",
+            label_until="until",
+        )
+
+        form = create_form(
+            [plugin], form_class=OtherFieldsForm, form_kwargs={"auto_id": ""}
+        )
+        self.assertEqual(form._bound_fields_cache, {})
+        self.assertEqual(list(form._f3f_plugin_fields), [plugin, None])
+        self.assertEqual(len(form._f3f_plugin_fields), 2)
+
+        fields = form.get_form_fields(plugin, strip_name_prefix=True)
+        self.assertEqual(set(fields), {"from", "until"})
+        self.assertEqual(
+            set(form._bound_fields_cache), {"duration_from", "duration_until"}
+        )
+        self.assertIs(form.get_form_fields(plugin)["duration_from"], fields["from"])
+        self.assertEqual(set(form.get_form_fields(None)), {"email"})
+
+        with self.assertRaises(KeyError):
+            form.get_form_fields(Duration(pk=42))
+
+    def test_create_forms(self):
+        cf1 = ConfiguredForm.objects.create(name="Test 1", form_type="contact")
+        cf2 = ConfiguredForm.objects.create(name="Test 2", form_type="other-fields")
+        Email.objects.create(parent=cf1, region="form", ordering=10, name="email")
+        PlainText.objects.create(parent=cf1, region="form", ordering=20, text="Hi")
+        Text.objects.create(parent=cf2, region="form", ordering=10, name="subject")
+
+        with self.assertNumQueries(2):
+            contents = contents_for_items(
+                [cf1, cf2], plugins=[PlainText, SimpleField], regions=cf1.regions
+            )
+            forms = create_forms(
+                contents,
+                form_kwargs={
+                    "data": {f"{short_prefix(cf1, 'form')}-email": "a@example.com"}
+                },
+            )
+
+        self.assertEqual(list(forms), [cf1, cf2])
+        self.assertEqual(list(forms[cf1].fields), ["email"])
+        self.assertEqual(list(forms[cf2].fields), ["email", "subject"])
+        self.assertNotEqual(forms[cf1].prefix, forms[cf2].prefix)
+        self.assertTrue(forms[cf1].is_valid())
+        self.assertFalse(forms[cf2].is_valid())
+
+    def test_cleaner_dependencies(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        plugin = Duration.objects.create(
+            parent=cf,
+            region="form",
+            name="duration",
+            ordering=10,
+            label_from="from",
+            label_until="until",
+        )
+        calls = []
+
+        def clean_anything(form, data):
+            calls.append(data)
+            return data
+
+        form = create_form(
+            [plugin],
+            form_kwargs={"data": {"duration_from": "2022-01-06", "duration_until": ""}},
+        )
+        form._f3f_cleaners = [*form._f3f_cleaners, clean_anything]
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ["duration_until"])
+        # The duration cleaner has been skipped, the undeclared one has run
+        self.assertEqual([hook for hook, _ in form.cleaner_timings], [clean_anything])
+        self.assertEqual(len(calls), 1)
+
+        form = create_form(
+            [plugin],
+            form_kwargs={
+                "data": {"duration_from": "2022-01-06", "duration_until": "2022-01-01"}
+            },
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors["duration_until"], ["Until has to be later than from."]
+        )
+        self.assertEqual(len(form.cleaner_timings), 1)
+        self.assertEqual(
+            form.cleaner_timings[0][0].fields, {"duration_from", "duration_until"}
+        )
+
+    async def test_async(self):
+        cf = await ConfiguredForm.objects.acreate(name="Test", form_type="contact")
+        await Text.objects.acreate(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        await PlainText.objects.acreate(
+            parent=cf, region="form", ordering=20, text="Thanks"
+        )
+
+        contents = await acontents_for_item(cf, plugins=[PlainText, SimpleField])
+        self.assertEqual(
+            [type(plugin) for plugin in contents], [SimpleField, PlainText]
+        )
+        self.assertIs(contents["form"][0].parent, cf)
+
+        prefix = short_prefix(cf, "form")
+        response = await self.async_client.get("/async/")
+        self.assertContains(response, f'name="{prefix}-name"')
+
+        # Synchronous processing functions run in a thread
+        response = await self.async_client.post("/async/", {f"{prefix}-name": "Hans"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], ".")
+
+        # Coroutines are awaited
+        cf.form_type = "async"
+        await cf.asave()
+        response = await self.async_client.post("/async/", {f"{prefix}-name": "Franz"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "..")
+
+        self.assertEqual(
+            [log.data async for log in Log.objects.order_by("id")],
+            [{"name": "Hans"}, {"name": "Franz"}],
+        )
+
+    def test_streaming(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        PlainText.objects.create(parent=cf, region="form", ordering=20, text="Thanks")
+        Email.objects.create(
+            parent=cf, region="form", ordering=30, label="Email", name="email"
+        )
+
+        response = self.client.get("/streaming/")
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 5)
+        self.assertIn("csrfmiddlewaretoken", chunks[0])
+        self.assertIn('name="form-', chunks[1])
+        self.assertEqual(chunks[2], "Thanks")
+        self.assertIn('type="email"', chunks[3])
+        self.assertIn("</html>", chunks[4])
+
+    def test_cached_unbound_form(self):
+        caches["default"].clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+
+        cache = caches["default"]
+        with mock.patch.object(cache, "get_or_set", wraps=cache.get_or_set) as patched:
+            response = self.client.get("/cached/")
+        self.assertEqual(patched.call_args.kwargs["timeout"], DEFAULT_TIMEOUT)
+        self.assertContains(response, 'name="form-')
+        self.assertContains(response, "csrfmiddlewaretoken")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/cached/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Only the configured form is loaded, the rendered form is cached
+        with self.assertNumQueries(1):
+            response = self.client.get("/cached/")
+        self.assertContains(response, 'name="form-')
+        self.assertEqual(response["ETag"], etag)
+
+        # A new CSRF secret changes the ETag
+        self.client.cookies.clear()
+        response = self.client.get("/cached/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # Changes to the form definition change the ETag and the cache key
+        etag = response["ETag"]
+        Text.objects.create(
+            parent=cf, region="form", ordering=20, label="Other", name="other"
+        )
+        cf.update_schema(plugins=[Text])
+        response = self.client.get("/cached/", headers={"if-none-match": etag})
+        self.assertContains(response, "-other")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_fragment_cache(self):
+        caches["default"].clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        text = PlainText.objects.create(
+            parent=cf, region="form", ordering=10, text="Hello"
+        )
+        field = Text.objects.create(
+            parent=cf, region="form", ordering=20, label="Name", name="name"
+        )
+
+        calls = []
+
+        def render(plugin, context):
+            calls.append(plugin)
+            return getattr(plugin, "text", "field")
+
+        cached = fragment_cache(render)
+        cache = caches["default"]
+        with mock.patch.object(cache, "get_or_set", wraps=cache.get_or_set) as patched:
+            self.assertEqual(cached(text, None), "Hello")
+        self.assertEqual(patched.call_args.kwargs["timeout"], DEFAULT_TIMEOUT)
+        self.assertEqual(cached(text, None), "Hello")
+        self.assertEqual(cached(field, None), "field")
+        self.assertEqual(cached(field, None), "field")
+        self.assertEqual(calls, [text, field, field])
+
+        # Modifications change the key
+        text.text = "World"
+        text.save()
+        self.assertEqual(cached(text, None), "World")
+        self.assertEqual(len(calls), 4)
+
+        # Custom stamps
+        cached = fragment_cache(render, stamp=lambda plugin: "v1")
+        self.assertEqual(cached(text, None), "World")
+        text.text = "Ignored"
+        self.assertEqual(cached(text, None), "World")
+
+    def test_form_region_renderer(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        Email.objects.create(
+            parent=cf, region="form", ordering=20, label="Email", name="email"
+        )
+        PlainText.objects.create(parent=cf, region="form", ordering=30, text="Hi")
+        Duration.objects.create(parent=cf, region="form", ordering=40, name="duration")
+
+        class FieldsTemplateRenderer(FormRegionRenderer):
+            fields_template_name = "forms/fields.html"
+
+        for renderer_class in [FormRegionRenderer, FieldsTemplateRenderer]:
+            renderer = renderer_class()
+            renderer.register(PlainText, lambda plugin, context: plugin.text)
+            renderer.register_fields([SimpleField, Duration])
+
+            contents = contents_for_item(cf, plugins=renderer.plugins())
+            form = create_form(contents["form"], form_kwargs={})
+            context = Context({"form": form})
+
+            chunks = list(renderer.handle(contents["form"], context))
+            self.assertEqual(len(chunks), 3)
+            self.assertIn('name="name"', chunks[0])
+            self.assertIn('name="email"', chunks[0])
+            self.assertEqual(chunks[1], "Hi")
+            self.assertIn('name="duration_from"', chunks[2])
+            self.assertIn('name="duration_until"', chunks[2])
+
+        self.assertEqual(chunks[0].count('<div class="field">'), 2)
+
+    def test_wizard(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="wizard")
+        Text.objects.create(
+            parent=cf, region="personal", ordering=10, label="Name", name="name"
+        )
+        Date.objects.create(
+            parent=cf, region="details", ordering=10, label="Date", name="date"
+        )
+        personal = short_prefix(cf, "personal")
+        details = short_prefix(cf, "details")
+
+        response = self.client.get("/wizard/")
+        self.assertContains(response, f'name="{personal}-name"')
+        self.assertNotContains(response, f'name="{details}-date"')
+
+        response = self.client.post("/wizard/", {f"{personal}-name": "Hans"})
+        self.assertRedirects(response, "/wizard/")
+
+        response = self.client.get("/wizard/")
+        self.assertNotContains(response, f'name="{personal}-name"')
+        self.assertContains(response, f'name="{details}-date"')
+
+        response = self.client.post("/wizard/", {f"{details}-date": "invalid"})
+        self.assertContains(response, "Enter a valid date.")
+
+        response = self.client.post("/wizard/", {f"{details}-date": "2026-10-16"})
+        self.assertRedirects(response, "/wizard/")
+        self.assertEqual(Log.objects.get().data, {"name": "Hans", "date": "2026-10-16"})
+
+        # The state has been reset
+        response = self.client.get("/wizard/")
+        self.assertContains(response, f'name="{personal}-name"')
+
+        # Changing the form definition discards the state
+        self.client.post("/wizard/", {f"{personal}-name": "Hans"})
+        self.assertContains(self.client.get("/wizard/"), f'name="{details}-date"')
+        cf.update_schema(plugins=[SimpleField])
+        self.assertContains(self.client.get("/wizard/"), f'name="{personal}-name"')
+
+    def test_validate_field(self):
+        get_field_plugins.cache_clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Email.objects.create(
+            parent=cf, region="form", ordering=10, label="Email", name="email"
+        )
+        Duration.objects.create(parent=cf, region="form", ordering=20, name="duration")
+        prefix = short_prefix(cf, "form")
+
+        # No snapshot yet
+        self.assertEqual(self.client.post("/validate/email/").status_code, 404)
+
+        cf.update_schema(plugins=[SimpleField, Duration])
+
+        with self.assertNumQueries(1):
+            response = self.client.post("/validate/email/", {f"{prefix}-email": "x"})
+        self.assertEqual(
+            response.json(),
+            {
+                "errors": {
+                    "email": [
+                        {"message": "Enter a valid email address.", "code": "invalid"}
+                    ]
+                }
+            },
+        )
+
+        response = self.client.post(
+            "/validate/email/", {f"{prefix}-email": "test@example.com"}
+        )
+        self.assertEqual(response.json(), {"errors": {}})
+
+        response = self.client.post(
+            "/validate/duration_until/",
+            {
+                f"{prefix}-duration_from": "2026-10-16",
+                f"{prefix}-duration_until": "2026-10-01",
+            },
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "errors": {
+                    "duration_until": [
+                        {"message": "Until has to be later than from.", "code": ""}
+                    ]
+                }
+            },
+        )
+
+        self.assertEqual(self.client.post("/validate/unknown/").status_code, 404)
+
+    def test_validation_schema(self):
+        get_validation_schema.cache_clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        Email.objects.create(
+            parent=cf,
+            region="form",
+            ordering=20,
+            label="Email",
+            name="email",
+            is_required=False,
+        )
+        Select.objects.create(
+            parent=cf,
+            region="form",
+            ordering=30,
+            label="Select",
+            name="select",
+            choices="a\nb",
+        )
+        Duration.objects.create(parent=cf, region="form", ordering=40, name="duration")
+
+        self.assertIsNone(get_validation_schema(cf))
+        cf.update_schema(plugins=[SimpleField, Duration])
+
+        schema = {
+            "name": {"type": "text", "required": True},
+            "email": {"type": "email", "required": False, "max_length": 320},
+            "select": {
+                "type": "choice",
+                "required": True,
+                "choices": ["", "a", "b"],
+            },
+            "duration_from": {"type": "date", "required": True},
+            "duration_until": {
+                "type": "date",
+                "required": True,
+                "after": "duration_from",
+            },
+        }
+        with self.assertNumQueries(0):
+            self.assertEqual(get_validation_schema(cf), schema)
+
+        self.assertEqual(
+            [
+                field_constraints(field)["type"]
+                for field in [
+                    forms.IntegerField(),
+                    forms.DecimalField(),
+                    forms.FloatField(),
+                    forms.DateTimeField(),
+                    forms.CharField(),
+                ]
+            ],
+            ["integer", "number", "number", "datetime", "text"],
+        )
+        self.assertEqual(
+            field_constraints(forms.DecimalField(required=False, min_value=1)),
+            {"type": "number", "required": False, "min_value": 1},
+        )
+
+        response = self.client.get("/")
+        self.assertContains(response, 'id="form-validation"')
+        self.assertEqual(
+            json.loads(
+                response.content.decode()
+                .split('id="form-validation" type="application/json">')[1]
+                .split("</script>")[0]
+            ),
+            {"prefix": short_prefix(cf, "form"), "fields": schema},
+        )
+
+    def test_screening(self):
+        get_honeypot_fields.cache_clear()
+        get_screeners.cache_clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Email.objects.create(
+            parent=cf, region="form", ordering=10, label="Email", name="email"
+        )
+        Honeypot.objects.create(parent=cf, region="form", ordering=20)
+        cf.update_schema(plugins=[SimpleField, Honeypot])
+        prefix = short_prefix(cf, "form")
+
+        self.assertEqual(get_honeypot_fields(cf), ["honeypot"])
+        self.assertEqual(len(get_screeners(cf)), 1)
+
+        response = self.client.get("/screened/")
+        token = re.search(
+            rf'name="{prefix}-{TIMING_FIELD}" value="([^"]+)"',
+            response.content.decode(),
+        )[1]
+        data = {f"{prefix}-email": "test@example.com", f"{prefix}-honeypot": ""}
+
+        # Too fast
+        response = self.client.post(
+            "/screened/", data | {f"{prefix}-{TIMING_FIELD}": token}
+        )
+        self.assertContains(response, "timing", status_code=400)
+
+        # Missing or broken tokens
+        response = self.client.post("/screened/", data)
+        self.assertContains(response, "timing", status_code=400)
+        response = self.client.post(
+            "/screened/", data | {f"{prefix}-{TIMING_FIELD}": token + "x"}
+        )
+        self.assertContains(response, "timing", status_code=400)
+
+        data[f"{prefix}-{TIMING_FIELD}"] = signing.dumps(
+            int(time.time()) - 10, salt=TIMING_SALT
+        )
+
+        # Bots are rejected before loading plugins
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                "/screened/", data | {f"{prefix}-honeypot": "spam"}
+            )
+        self.assertContains(response, "honeypot", status_code=400)
+
+        # Plugin screeners
+        response = self.client.post(
+            "/screened/",
+            {key: value for key, value in data.items() if "honeypot" not in key},
+        )
+        self.assertContains(response, "missing", status_code=400)
+
+        response = self.client.post(
+            "/screened/",
+            data | {f"{prefix}-message": "x" * 1024 * 1024},
+        )
+        self.assertContains(response, "size", status_code=400)
+
+        response = self.client.post("/screened/", data)
+        self.assertRedirects(response, "/screened/", fetch_redirect_response=False)
+        self.assertEqual(
+            Log.objects.get().data, {"email": "test@example.com", "honeypot": ""}
+        )
+
+    def test_export(self):
+        get_schema_loaders.cache_clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        text = Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        SelectMultiple.objects.create(
+            parent=cf,
+            region="form",
+            ordering=20,
+            label="Colors",
+            name="colors",
+            choices="red\ngreen",
+        )
+        cf.update_schema(plugins=[SimpleField])
+        logs = [
+            Log.objects.create(configured_form=cf, data={"name": "Hans"}),
+            Log.objects.create(
+                configured_form=cf,
+                data={"name": "Franz, Jr.", "colors": ["red", "green"]},
+            ),
+        ]
+
+        # Rename the field; older submissions still use the old schema
+        text.name = "full_name"
+        text.label = "Full name"
+        text.save()
+        cf.update_schema(plugins=[SimpleField])
+        logs.append(Log.objects.create(configured_form=cf, data={"full_name": "Fritz"}))
+
+        other = ConfiguredForm.objects.create(name="Other", form_type="contact")
+        Email.objects.create(
+            parent=other, region="form", ordering=10, label="Email", name="email"
+        )
+        other.update_schema(plugins=[SimpleField])
+        logs.append(
+            Log.objects.create(configured_form=other, data={"email": "a@example.com"})
+        )
+
+        def rows():
+            return export_rows(
+                Log.objects.all(),
+                columns=[("ID", attrgetter("pk"))],
+                chunk_size=1,
+            )
+
+        # Submissions, both configured forms and the superseded snapshot
+        with self.assertNumQueries(4):
+            self.assertEqual(
+                "".join(stream_csv(rows())),
+                f"ID,Name,Colors\r\n{logs[0].pk},Hans,\r\n"
+                f'{logs[1].pk},"Franz, Jr.","red, green"\r\n'
+                f"ID,Full name,Colors\r\n{logs[2].pk},Fritz,\r\n"
+                f"ID,Email\r\n{logs[3].pk},a@example.com\r\n",
+            )
+
+        file = io.StringIO(newline="")
+        write_csv(rows(), file)
+        self.assertEqual(file.getvalue(), "".join(stream_csv(rows())))
+
+        groups = export_groups(Log.objects.all())
+        self.assertEqual(
+            [
+                (submission.configured_form, submission.schema_version, list(rows))
+                for submission, rows in groups
+            ],
+            [
+                (
+                    cf,
+                    1,
+                    [
+                        ["Name", "Colors"],
+                        ["Hans", None],
+                        ["Franz, Jr.", "red, green"],
+                    ],
+                ),
+                (cf, 2, [["Full name", "Colors"], ["Fritz", None]]),
+                (other, 1, [["Email"], ["a@example.com"]]),
+            ],
+        )
+
+        file = io.BytesIO()
+        write_xlsx(
+            (
+                (f"{submission.configured_form}: v{submission.schema_version}", rows)
+                for submission, rows in export_groups(Log.objects.all())
+            ),
+            file,
+        )
+        with zipfile.ZipFile(file) as xlsx:
+            names = xlsx.namelist()
+            workbook = xlsx.read("xl/workbook.xml").decode()
+            sheet = xlsx.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn("xl/worksheets/sheet3.xml", names)
+        self.assertIn('name="Test v1"', workbook)
+        self.assertIn("Franz, Jr.", sheet)
+        self.assertIn("red, green", sheet)
+
+        # Superseded versions without a snapshot use the current snapshot
+        ConfiguredFormSchema.objects.all().delete()
+        get_schema_loaders.cache_clear()
+        self.assertEqual(
+            next(export_rows(Log.objects.filter(configured_form=cf))),
+            ["Full name", "Colors"],
+        )
+
+        # Configured forms without any snapshot cannot be exported
+        empty = ConfiguredForm.objects.create(name="Empty", form_type="contact")
+        Log.objects.create(configured_form=empty, data={"name": "Hans"})
+        with self.assertRaisesRegex(ValueError, "No loaders"):
+            list(export_rows(Log.objects.filter(configured_form=empty)))
+
+    def test_compile_loaders(self):
+        def custom_loader(data):
+            return {"name": "custom", "label": "Custom", "value": data.get("a", 0) * 2}
+
+        simple = Text(name="name", label="Name").get_loaders()
+        header, extract = compile_loaders(simple)
+        self.assertEqual(header, ["Name"])
+        self.assertEqual(extract({"name": "Hans"}), ("Hans",))
+        self.assertEqual(extract({}), (None,))
+
+        header, extract = compile_loaders([*simple, custom_loader])
+        self.assertEqual(header, ["Name", "Custom"])
+        self.assertEqual(extract({"name": "Hans", "a": 21}), ("Hans", 42))
+        self.assertEqual(
+            extract({"name": "Hans"}),
+            tuple(
+                loader({"name": "Hans"})["value"] for loader in [*simple, custom_loader]
+            ),
+        )
+
+        # Loaders requiring their key get the data of a submission
+        def strict_loader(data):
+            return {"name": "a", "label": "A", "value": data["a"]}
+
+        with self.assertRaises(KeyError):
+            compile_loaders([strict_loader])
+        header, extract = compile_loaders([strict_loader], data={"a": 1})
+        self.assertEqual(header, ["A"])
+
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        log = Log.objects.create(configured_form=cf, data={"a": 1})
+        self.assertEqual(
+            list(export_rows(Log.objects.all(), loaders=lambda s: [strict_loader])),
+            [["A"], [1]],
+        )
+        self.assertEqual(
+            cached_report_rows(log, loaders=[strict_loader])[0]["value"], 1
+        )
+
+    def test_cached_report_rows(self):
+        caches["default"].clear()
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        loaders = Text(name="name", label="Name").get_loaders()
+        log = Log.objects.create(configured_form=cf, data={"name": "https://x.ch"})
+
+        with mock.patch("feincms3_forms.reporting.urlize", wraps=urlize) as patched:
+            rows = cached_report_rows(log, loaders=loaders)
+            self.assertEqual(cached_report_rows(log, loaders=loaders), rows)
+            self.assertEqual(patched.call_count, 1)
+
+            log.data = {"name": "Hans"}
+            log.save()
+            self.assertEqual(
+                cached_report_rows(log, loaders=loaders),
+                [
+                    {
+                        "name": "name",
+                        "label": "Name",
+                        "value": "Hans",
+                        "pretty": "Hans",
+                    }
+                ],
+            )
+            self.assertEqual(patched.call_count, 2)
+
+            # Different loaders don't return the cached rows
+            relabeled = Text(name="name", label="Full name").get_loaders()
+            self.assertEqual(
+                cached_report_rows(log, loaders=relabeled)[0]["label"], "Full name"
+            )
+            self.assertEqual(patched.call_count, 3)
+
+        with mock.patch.object(
+            caches["default"], "get_or_set", return_value=[]
+        ) as get_or_set:
+            cached_report_rows(log, loaders=loaders)
+        self.assertEqual(get_or_set.call_args.kwargs["timeout"], DEFAULT_TIMEOUT)
+
+        self.assertEqual(
+            simple_report(rows=rows),
+            simple_report(loaders=loaders, data={"name": "https://x.ch"}),
+        )
+
+        # Choice loaders carry a read-only mapping of labels
+        choices = [
+            *Select(
+                name="canton", label="Canton", choices="ZH\nBE", type=Select.TYPE
+            ).get_loaders(),
+            *SelectMultiple(
+                name="colors",
+                label="Colors",
+                choices="red | Red\ngreen | Green",
+                type=SelectMultiple.TYPE,
+            ).get_loaders(),
+        ]
+        log.data = {"canton": "zh", "colors": ["red", "green"]}
+        self.assertEqual(
+            [row["value"] for row in cached_report_rows(log, loaders=choices)],
+            ["ZH", ["Red", "Green"]],
+        )
+        self.assertIn('<a href="https://x.ch"', simple_report(rows=rows))
+
+    def test_field_statistics(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        Integer.objects.create(
+            parent=cf, region="form", ordering=20, label="Age", name="age"
+        )
+        Date.objects.create(
+            parent=cf, region="form", ordering=30, label="Date", name="date"
+        )
+        Select.objects.create(
+            parent=cf,
+            region="form",
+            ordering=40,
+            label="Canton",
+            name="canton",
+            choices="ZH\nBE\nGR",
+        )
+        CheckboxSelectMultiple.objects.create(
+            parent=cf,
+            region="form",
+            ordering=50,
+            label="Colors",
+            name="colors",
+            choices="red\ngreen\nblue",
+        )
+        for data in [
+            {"name": "a", "age": 20, "date": "2026-01-01", "canton": "zh"},
+            {"name": "", "age": 40, "date": "2026-03-01", "canton": "zh"},
+            {"name": "b", "age": None, "canton": "be", "colors": ["red", "blue"]},
+            {"colors": []},
+            {"colors": ["red"], "canton": None},
+        ]:
+            Log.objects.create(configured_form=cf, data=data)
+
+        fields = cf.get_formfields_union(
+            plugins=[SimpleField], attributes=["type", "choices"]
+        )
+        with self.assertNumQueries(3):
+            statistics = field_statistics(
+                Log.objects.filter(configured_form=cf), fields=fields
+            )
+        self.assertEqual(
+            statistics,
+            {
+                "name": {"type": "text", "filled": 2, "total": 5},
+                "age": {
+                    "type": "integer",
+                    "filled": 2,
+                    "total": 5,
+                    "min": 20,
+                    "max": 40,
+                    "avg": 30,
+                },
+                "date": {
+                    "type": "date",
+                    "filled": 2,
+                    "total": 5,
+                    "min": "2026-01-01",
+                    "max": "2026-03-01",
+                },
+                "canton": {
+                    "type": "select",
+                    "filled": 3,
+                    "total": 5,
+                    "choices": {"zh": 2, "be": 1},
+                },
+                "colors": {
+                    "type": "checkbox-select-multiple",
+                    "filled": 2,
+                    "total": 5,
+                    "choices": {"red": 2, "blue": 1},
+                },
+            },
+        )
+
+        # Names which would be parsed as lookups
+        other = ConfiguredForm.objects.create(name="Other", form_type="contact")
+        for data in [
+            {"contains": "x", "exact": "zh", "in": ["a"]},
+            {"contains": "", "exact": "be", "in": []},
+            {},
+        ]:
+            Log.objects.create(configured_form=other, data=data)
+        self.assertEqual(
+            field_statistics(
+                Log.objects.filter(configured_form=other),
+                fields=[
+                    ("contains", {"type": "text"}),
+                    ("exact", {"type": "select"}),
+                    ("in", {"type": "checkbox-select-multiple", "choices": "a\nb"}),
+                ],
+            ),
+            {
+                "contains": {"type": "text", "filled": 1, "total": 3},
+                "exact": {
+                    "type": "select",
+                    "filled": 2,
+                    "total": 3,
+                    "choices": {"zh": 1, "be": 1},
+                },
+                "in": {
+                    "type": "checkbox-select-multiple",
+                    "filled": 1,
+                    "total": 3,
+                    "choices": {"a": 1},
+                },
+            },
+        )
+
+        # All-digit names are array indexes for key transforms
+        digits = ConfiguredForm.objects.create(name="Digits", form_type="contact")
+        for data in [
+            {"10": "zh", "11": 3, "12": ["a", "b"], "13": "x"},
+            {"10": "be", "11": 5, "12": ["a"], "13": ""},
+            {"10": "zh", "11": None, "12": []},
+        ]:
+            Log.objects.create(configured_form=digits, data=data)
+        self.assertEqual(
+            field_statistics(
+                Log.objects.filter(configured_form=digits),
+                fields=[
+                    ("10", {"type": "select"}),
+                    ("11", {"type": "integer"}),
+                    ("12", {"type": "select-multiple", "choices": "a\nb"}),
+                    ("13", {"type": "text"}),
+                ],
+            ),
+            {
+                "10": {
+                    "type": "select",
+                    "filled": 3,
+                    "total": 3,
+                    "choices": {"zh": 2, "be": 1},
+                },
+                "11": {
+                    "type": "integer",
+                    "filled": 2,
+                    "total": 3,
+                    "min": 3,
+                    "max": 5,
+                    "avg": 4,
+                },
+                "12": {
+                    "type": "select-multiple",
+                    "filled": 2,
+                    "total": 3,
+                    "choices": {"a": 2, "b": 1},
+                },
+                "13": {"type": "text", "filled": 1, "total": 3},
+            },
+        )
+
+    def test_choice_loaders(self):
+        choices = "ch-de | German-speaking Switzerland\nch-fr | Romandy\nTicino"
+        data = {
+            "text": "ch-de",
+            "select": "ch-de",
+            "radio": "ticino",
+            "multiple": ["ch-fr", "ticino", "unknown"],
+            "checkboxes": [],
+        }
+        loaders = [
+            *Text(name="text", label="Text").get_loaders(),
+            *Select(
+                type=Select.TYPE, name="select", label="Select", choices=choices
+            ).get_loaders(),
+            *Radio(
+                type=Radio.TYPE, name="radio", label="Radio", choices=choices
+            ).get_loaders(),
+            *SelectMultiple(
+                type=SelectMultiple.TYPE,
+                name="multiple",
+                label="Multiple",
+                choices=choices,
+            ).get_loaders(),
+            *CheckboxSelectMultiple(
+                type=CheckboxSelectMultiple.TYPE,
+                name="checkboxes",
+                label="Checkboxes",
+                choices=choices,
+            ).get_loaders(),
+        ]
+        values = [
+            "ch-de",
+            "German-speaking Switzerland",
+            "Ticino",
+            ["Romandy", "Ticino", "unknown"],
+            [],
+        ]
+        self.assertEqual([loader(data)["value"] for loader in loaders], values)
+        self.assertEqual(
+            [loader({})["value"] for loader in loaders], [None] * len(loaders)
+        )
+
+        header, extract = compile_loaders(loaders)
+        self.assertEqual(header, ["Text", "Select", "Radio", "Multiple", "Checkboxes"])
+        self.assertEqual(extract(data), tuple(values))
+        self.assertEqual(extract({}), (None,) * len(loaders))
+
+        # Data stored by other field types is returned unchanged
+        other = {
+            "text": "ch-de",
+            "select": ["ch-de"],
+            "radio": {"a": 1},
+            "multiple": "ch-fr",
+            "checkboxes": [["ch-fr"], "ch-fr"],
+        }
+        values = ["ch-de", ["ch-de"], {"a": 1}, "ch-fr", [["ch-fr"], "Romandy"]]
+        self.assertEqual([loader(other)["value"] for loader in loaders], values)
+        self.assertEqual(extract(other), tuple(values))
+
+    def test_schema_cache(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="contact")
+        Text.objects.create(
+            parent=cf, region="form", ordering=10, label="Name", name="name"
+        )
+        calls = []
+
+        def build(contents):
+            calls.append(contents)
+            return [plugin.name for plugin in contents]
+
+        cache = SchemaCache(build, maxsize=1)
+        self.assertIsNone(cache.get(cf))
+
+        cf.update_schema(plugins=[SimpleField])
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get(cf), ["name"])
+            self.assertEqual(cache.get(cf, 1), ["name"])
+        self.assertEqual(len(calls), 1)
+
+        Text.objects.create(
+            parent=cf, region="form", ordering=20, label="Email", name="email"
+        )
+        cf.update_schema(plugins=[SimpleField])
+        self.assertEqual(cache.get(cf), ["name", "email"])
+        # The maxsize of 1 evicted the first version
+        self.assertEqual(cache.get(cf, 1), ["name"])
+        self.assertEqual(len(calls), 3)
+
+        cache.clear()
+        self.assertEqual(cache.get(cf, 1), ["name"])
+        self.assertEqual(len(calls), 4)
+
+        # Recently used entries are kept
+        cache = SchemaCache(build, maxsize=2)
+        cache.get(cf, 1)
+        cache.get(cf, 2)
+        cache.get(cf, 1)
+        cache.get(cf, 3)
+        del calls[:]
+        with self.assertNumQueries(0):
+            cache.get(cf, 1)
+        self.assertEqual(calls, [])
+
+        # Concurrent evictions don't fail
+        class Form:
+            _meta = ConfiguredForm._meta
+            pk = 1
+            schema_version = 1
+
+            def schema_contents(self, version):
+                return [version]
+
+        cache = SchemaCache(list, maxsize=4)
+        errors = []
+
+        def worker():
+            try:
+                for version in range(500):
+                    cache.get(Form(), version)
+            except (KeyError, RuntimeError) as exc:  # pragma: no cover
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache._entries), 4)
+
+    def test_wizard_process_failure(self):
+        cf = ConfiguredForm.objects.create(name="Test", form_type="wizard")
+        Text.objects.create(
+            parent=cf, region="personal", ordering=10, label="Name", name="name"
+        )
+        Text.objects.create(
+            parent=cf, region="details", ordering=10, label="City", name="city"
+        )
+        personal = short_prefix(cf, "personal")
+        details = short_prefix(cf, "details")
+
+        self.client.post("/wizard/", {f"{personal}-name": "Hans"})
+        # Exceptions resulting in a non-500 response persist the session
+        with mock.patch.object(cf.type, "process", side_effect=PermissionDenied):
+            response = self.client.post("/wizard/", {f"{details}-city": "Zurich"})
+        self.assertEqual(response.status_code, 403)
+
+        # The completed state is persisted
+        wizard = Wizard(mock.Mock(session=self.client.session), cf)
+        self.assertIsNone(wizard.step)
+        self.assertEqual(wizard.data, {"name": "Hans", "city": "Zurich"})
+        with self.assertRaisesRegex(ValueError, "have been completed"):
+            wizard.create_form({})
+
+        # The view starts over instead of crashing
+        response = self.client.get("/wizard/")
+        self.assertContains(response, f'name="{personal}-name"')
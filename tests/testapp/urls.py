@@ -7,4 +7,14 @@ from testapp import views
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", views.form, name="form"),
+    path("async/", views.form_async, name="form_async"),
+    path("cached/", views.form_cached, name="form_cached"),
+    path("screened/", views.form_screened, name="form_screened"),
+    path("streaming/", views.form_streaming, name="form_streaming"),
+    path("wizard/", views.form_wizard, name="form_wizard"),
+    path(
+        "validate/<str:name>/",
+        views.form_validate_field,
+        name="form_validate_field",
+    ),
 ]
@@ -1,32 +1,41 @@
+from asgiref.sync import sync_to_async
 from content_editor.contents import contents_for_item
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.middleware.csrf import get_token
 from django.shortcuts import render
-from feincms3.renderer import RegionRenderer, template_renderer
+from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
 
-from feincms3_forms.renderer import create_form, short_prefix
+from feincms3_forms.renderer import (
+    FormRegionRenderer,
+    acontents_for_item,
+    create_form,
+    fragment_cache,
+    get_validation_schema,
+    render_unbound_form,
+    short_prefix,
+    stream_regions,
+    unbound_form_etag,
+    validate_field,
+)
+from feincms3_forms.screening import screen, timing_token_input
+from feincms3_forms.wizard import Wizard
 from testapp.models import ConfiguredForm, Duration, Honeypot, PlainText, SimpleField
 
 
-def simple_field_context(plugin, context):
-    return {"plugin": plugin, "fields": context["form"].get_form_fields(plugin)}
-
-
-renderer = RegionRenderer()
+renderer = FormRegionRenderer()
 renderer.register(
     PlainText,
-    lambda plugin, context: plugin.text,
-)
-renderer.register(
-    SimpleField,
-    template_renderer("forms/simple-field.html", simple_field_context),
-)
-renderer.register(
-    Duration,
-    template_renderer("forms/simple-field.html", simple_field_context),
-)
-renderer.register(
-    Honeypot,
-    template_renderer("forms/simple-field.html", simple_field_context),
+    fragment_cache(lambda plugin, context: plugin.text),
 )
+renderer.register_fields([SimpleField, Duration, Honeypot])
 
 
 def form(request):
@@ -43,6 +52,7 @@ def form(request):
         contents["form"],
         form_class=cf.type.form_class,
         form_kwargs=form_kwargs,
+        cache=True,
     )
 
     if form.is_valid():
@@ -51,5 +61,151 @@ def form(request):
     context["form"] = form
     context["form_other_fields"] = form.get_form_fields(None)
     context["form_regions"] = renderer.regions_from_contents(contents)
+    context["form_timing_input"] = timing_token_input(form.prefix)
+    context["form_validation"] = {
+        "prefix": form.prefix,
+        "fields": get_validation_schema(cf),
+    }
 
     return render(request, "forms/form.html", context)
+
+
+async def form_async(request):
+    cf = await ConfiguredForm.objects.afirst()
+
+    contents = await acontents_for_item(cf, plugins=renderer.plugins())
+
+    form_kwargs = {"prefix": short_prefix(cf, "form")}
+    if request.method == "POST":
+        form_kwargs |= {"data": request.POST, "files": request.FILES}
+
+    # create_form and validation don't hit the database
+    form = create_form(
+        contents["form"],
+        form_class=cf.type.form_class,
+        form_kwargs=form_kwargs,
+        cache=True,
+    )
+
+    if form.is_valid():
+        return await cf.type.aprocess(request, form, configured_form=cf)
+
+    context = {
+        "form": form,
+        "form_other_fields": form.get_form_fields(None),
+        "form_regions": renderer.regions_from_contents(contents),
+    }
+    return await sync_to_async(render)(request, "forms/form.html", context)
+
+
+def form_streaming(request):
+    cf = ConfiguredForm.objects.first()
+    contents = contents_for_item(cf, plugins=renderer.plugins())
+    form = create_form(
+        contents["form"],
+        form_class=cf.type.form_class,
+        form_kwargs={"prefix": short_prefix(cf, "form")},
+        cache=True,
+    )
+
+    def stream():
+        yield render_to_string("forms/stream-head.html", request=request)
+        yield from stream_regions(
+            renderer,
+            contents=contents,
+            context=RequestContext(request, {"form": form}),
+        )
+        yield from (str(field) for field in form.get_form_fields(None).values())
+        yield render_to_string("forms/stream-tail.html", request=request)
+
+    return StreamingHttpResponse(stream())
+
+
+def form_cached(request):
+    if request.method == "POST":
+        return form(request)
+
+    cf = ConfiguredForm.objects.first()
+    prefix = short_prefix(cf, "form")
+    # Initialize the CSRF secret first so that it is part of the ETag
+    get_token(request)
+    etag = unbound_form_etag(request, cf, prefix=prefix)
+    if response := get_conditional_response(request, etag=etag):
+        return response
+
+    def render_form():
+        contents = contents_for_item(cf, plugins=renderer.plugins())
+        form = create_form(
+            contents["form"],
+            form_class=cf.type.form_class,
+            form_kwargs={"prefix": prefix},
+        )
+        return "".join(
+            [
+                *stream_regions(
+                    renderer,
+                    contents=contents,
+                    context=RequestContext(request, {"form": form}),
+                ),
+                *(str(field) for field in form.get_form_fields(None).values()),
+            ]
+        )
+
+    response = render(
+        request,
+        "forms/form-cached.html",
+        {"form_html": render_unbound_form(cf, prefix=prefix, render=render_form)},
+    )
+    response["ETag"] = etag
+    return response
+
+
+def form_wizard(request):
+    cf = ConfiguredForm.objects.first()
+    wizard = Wizard(request, cf)
+    if wizard.step is None:
+        # All steps have been completed but processing failed; start over
+        wizard.reset()
+    contents = contents_for_item(cf, plugins=renderer.plugins(), regions=[wizard.step])
+
+    form_kwargs = {}
+    if request.method == "POST":
+        form_kwargs |= {"data": request.POST, "files": request.FILES}
+
+    form = wizard.create_form(contents, form_kwargs=form_kwargs)
+
+    if form.is_valid():
+        wizard.save_step(form)
+        if wizard.step is not None:
+            return HttpResponseRedirect(".")
+        response = cf.type.process(request, form, configured_form=cf, data=wizard.data)
+        wizard.reset()
+        return response
+
+    context = {
+        "form": form,
+        "form_other_fields": form.get_form_fields(None),
+        "form_regions": renderer.regions_from_contents(contents),
+        "step": wizard.step,
+    }
+    return render(request, "forms/wizard.html", context)
+
+
+def form_validate_field(request, name):
+    cf = ConfiguredForm.objects.first()
+    errors = validate_field(
+        cf, name, data=request.POST, prefix=short_prefix(cf, "form")
+    )
+    if errors is None:
+        raise Http404
+    return JsonResponse({"errors": errors})
+
+
+def form_screened(request):
+    if request.method == "POST":
+        cf = ConfiguredForm.objects.first()
+        if reason := screen(
+            request, cf, prefix=short_prefix(cf, "form"), max_size=1024 * 1024
+        ):
+            return HttpResponseBadRequest(reason)
+    return form(request)